@@ -0,0 +1 @@
+# bench: data sintetis dan benchmark helper gudang_data (lihat bench/run.py)
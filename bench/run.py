@@ -0,0 +1,187 @@
+# bench/run.py
+# Benchmark helper data gudang di beberapa ukuran data, di atas SQLite lokal.
+#
+#   python -m bench.run --sizes 1000x10000,10000x100000 --repeat 3
+#
+# Hasil ditulis ke <out>/bench-<waktu>.json dan .csv supaya bisa dibandingkan
+# antar rilis.
+
+import argparse
+import csv
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import gudang_data as gd
+from gudang_storage import SQLiteBackend
+from bench import synth
+
+RESULT_FIELDS = ["case", "n_items", "n_transactions", "phase", "repeat", "seconds_min", "seconds_median", "rows", "error"]
+
+
+def parse_sizes(text):
+    """ "1000x10000,10000x100000" -> [(1000, 10000), (10000, 100000)] """
+    sizes = []
+    for part in text.split(","):
+        items, _, trx = part.strip().lower().partition("x")
+        sizes.append((int(float(items)), int(float(trx or 0))))
+    return sizes
+
+
+def _rows(value):
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    if isinstance(value, dict):
+        return value.get("rows")
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return None
+
+
+def time_case(fn, repeat, setup=None):
+    """ (waktu per percobaan, jumlah baris hasil terakhir); setup() dipanggil sebelum tiap percobaan """
+    times, result = [], None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return times, _rows(result)
+
+
+def bench_size(n_items, n_transactions, args, rng, log):
+    workdir = tempfile.mkdtemp(prefix="gudang-bench-")
+    try:
+        backend = SQLiteBackend(os.path.join(workdir, "gudang.db"))
+        gd.use_backend(backend)
+        t0 = time.perf_counter()
+        items = synth.seed(backend, n_items, n_transactions, rng, days=args.days, zipf_s=args.zipf)
+        log(f"  seed {n_items} item / {n_transactions} transaksi: {time.perf_counter() - t0:.1f}s")
+
+        sheet = synth.upload_sheet(items, max(1, int(n_items * args.upload_share)), rng)
+        xlsx = io.BytesIO()
+        sheet.to_excel(xlsx, index=False)
+        xlsx = xlsx.getvalue()
+
+        def cold_inventory():
+            gd.invalidate_inventory_cache()
+
+        def cold_transactions():
+            gd.invalidate_transactions_cache()
+
+        cases = [
+            ("get_inventory_df", "cold", gd.get_inventory_df, cold_inventory),
+            ("get_inventory_df", "warm", gd.get_inventory_df, None),
+            ("load_transactions_df", "cold", gd.load_transactions_df, cold_transactions),
+            ("load_transactions_df", "warm", gd.load_transactions_df, None),
+            ("totals_for_period:W", "db", lambda: gd.totals_for_period(None, "W"), None),
+            ("totals_for_period:M", "db", lambda: gd.totals_for_period(None, "M"), None),
+            ("totals_for_period:M", "pandas", lambda: gd.totals_for_period(gd.load_transactions_df(), "M"), None),
+            ("load_inventory_from_excel", "upsert", lambda: gd.load_inventory_from_excel(io.BytesIO(xlsx)), None),
+            ("export_db_to_excel_bytes", "full", gd.export_db_to_excel_bytes, None),
+        ]
+        results = []
+        for case, phase, fn, setup in cases:
+            if args.only and not any(case.startswith(o) for o in args.only):
+                continue
+            if phase == "pandas":
+                # paksa jalur pandas dengan menyembunyikan agregasi di database
+                fn = _pandas_totals(backend, fn)
+            row = {"case": case, "n_items": n_items, "n_transactions": n_transactions, "phase": phase,
+                   "repeat": args.repeat, "seconds_min": None, "seconds_median": None, "rows": None, "error": None}
+            try:
+                times, rows = time_case(fn, args.repeat, setup)
+                row.update(seconds_min=min(times), seconds_median=statistics.median(times), rows=rows)
+                log(f"  {case:<28} {phase:<7} min {min(times):8.3f}s  median {statistics.median(times):8.3f}s  rows {rows}")
+            except Exception as e:
+                # mis. sheet Excel > 1.048.576 baris; dicatat, benchmark tetap lanjut
+                row["error"] = f"{type(e).__name__}: {e}"
+                log(f"  {case:<28} {phase:<7} ERROR {row['error']}")
+            results.append(row)
+        return results
+    finally:
+        gd.invalidate_inventory_cache()
+        gd.invalidate_transactions_cache()
+        if args.keep:
+            log(f"  database disimpan di {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _pandas_totals(backend, fn):
+    def run():
+        backend.transaction_totals = lambda *a: None
+        try:
+            return fn()
+        finally:
+            del backend.transaction_totals
+    return run
+
+
+def _git_revision():
+    try:
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True, timeout=5,
+                             cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_results(results, meta, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    base = os.path.join(out_dir, f"bench-{stamp}")
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    with open(base + ".csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(meta) + RESULT_FIELDS)
+        writer.writeheader()
+        for r in results:
+            writer.writerow({**meta, **r})
+    return base
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark helper data aplikasi gudang")
+    p.add_argument("--sizes", default="1000x10000,10000x100000",
+                   help="daftar <item>x<transaksi>, dipisah koma (mis. 100000x10000000)")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--days", type=int, default=365, help="rentang waktu ledger")
+    p.add_argument("--zipf", type=float, default=1.1, help="eksponen Zipf popularitas item")
+    p.add_argument("--upload-share", type=float, default=0.1, help="ukuran sheet upload relatif ke jumlah item")
+    p.add_argument("--only", nargs="*", help="hanya case dengan awalan ini")
+    p.add_argument("--out", default="bench_results")
+    p.add_argument("--keep", action="store_true", help="jangan hapus database sementara")
+    args = p.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    meta = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "backend": "sqlite",
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+    }
+    results = []
+    for n_items, n_transactions in parse_sizes(args.sizes):
+        print(f"[{n_items} item x {n_transactions} transaksi]", flush=True)
+        results.extend(bench_size(n_items, n_transactions, args, rng, lambda msg: print(msg, flush=True)))
+    base = write_results(results, meta, args.out)
+    print(f"hasil: {base}.json, {base}.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# bench/synth.py
+# Generator data gudang sintetis: item dengan popularitas Zipf, ledger transaksi
+# berupa bundle masuk/keluar, dan tanggal kedaluwarsa.
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+CATEGORIES = ["ATK", "Kebersihan", "Elektronik", "Medis", "Makanan", "Minuman", "Sparepart", "Kemasan"]
+UNITS = ["pcs", "box", "kg", "liter", "rim", "pack", "roll", "set"]
+REQUESTERS = ["Gudang", "Produksi", "Admin", "Keuangan", "Maintenance", "Dapur", "QC", "Logistik"]
+SUPPLIERS = ["PT Sumber Makmur", "CV Maju Jaya", "PT Sinar Abadi", "UD Sentosa", "PT Karya Mandiri"]
+
+TRX_CHUNK = 100_000  # baris transaksi per batch insert saat seeding
+
+
+def make_items(n, rng, start=0, expiry_share=0.4) -> pd.DataFrame:
+    """ n item dengan nama unik; sebagian punya tanggal kedaluwarsa """
+    idx = np.arange(start, start + n)
+    cat = rng.integers(0, len(CATEGORIES), n)
+    today = pd.Timestamp(datetime.now().date())
+    expiry = today + pd.to_timedelta(rng.integers(-30, 720, n), unit="D")
+    has_expiry = rng.random(n) < expiry_share
+    return pd.DataFrame({
+        "name": [f"{CATEGORIES[c]} {i:07d}" for c, i in zip(cat, idx)],
+        "category": np.array(CATEGORIES)[cat],
+        "unit": np.array(UNITS)[rng.integers(0, len(UNITS), n)],
+        "quantity": np.round(rng.lognormal(4, 1.2, n)),
+        "min_stock": rng.integers(0, 50, n).astype("float64"),
+        "rack_location": [f"R{a:02d}-{s}" for a, s in zip(rng.integers(1, 40, n), rng.integers(1, 9, n))],
+        "expiry_date": pd.Series(expiry.date, dtype=object).where(has_expiry, None),
+    })
+
+
+def zipf_weights(n, s=1.1):
+    """ peluang item ke-k dipilih ~ 1/k^s (sedikit item sangat laris, ekor panjang) """
+    w = 1.0 / np.arange(1, n + 1) ** s
+    return w / w.sum()
+
+
+def iter_transactions(items: pd.DataFrame, n, rng, days=365, zipf_s=1.1, out_share=0.65, max_bundle=12, chunk=TRX_CHUNK):
+    """ Generator DataFrame transaksi (kolom tabel transactions, tanpa id), urut created_at.
+    Setiap bundle berisi 1..max_bundle baris dengan trx_code yang sama. """
+    weights = zipf_weights(len(items), zipf_s)
+    popularity = rng.permutation(len(items))  # item terlaris tidak harus id kecil
+    end = datetime.now()
+    start = end - timedelta(days=days)
+    span = (end - start).total_seconds()
+    names = items["name"].to_numpy()
+    units = items["unit"].to_numpy()
+    expiry = items["expiry_date"].to_numpy()
+    done = 0
+    while done < n:
+        m = min(chunk, n - done)
+        # ukuran bundle ~ geometrik, lalu dipotong supaya tepat m baris
+        sizes = np.minimum(rng.geometric(0.35, m), max_bundle)
+        sizes = sizes[:np.searchsorted(np.cumsum(sizes), m) + 1]
+        sizes[-1] -= sizes.sum() - m
+        bundle = np.repeat(np.arange(len(sizes)), sizes)
+
+        t0 = start.timestamp() + span * done / n
+        t1 = start.timestamp() + span * (done + m) / n
+        bundle_ts = np.sort(rng.uniform(t0, t1, len(sizes)))
+        created = pd.to_datetime(bundle_ts[bundle], unit="s")
+        is_out = (rng.random(len(sizes)) < out_share)[bundle]
+        pick = popularity[rng.choice(len(items), m, p=weights)]
+        trx_type = np.where(is_out, "out", "in")
+        rand = rng.integers(100, 1000, len(sizes))[bundle]
+        stamp = created.strftime("%Y%m%d-%H%M%S")
+        codes = [f"TRX-{t.upper()}-{s}-{r}" for t, s, r in zip(trx_type, stamp, rand)]
+
+        yield pd.DataFrame({
+            "trx_type": trx_type,
+            "item_id": pick + 1,
+            "name": names[pick],
+            "quantity": np.maximum(1, np.round(rng.lognormal(1.5, 0.9, m))),
+            "unit": units[pick],
+            "requester": np.where(is_out, np.array(REQUESTERS)[rng.integers(0, len(REQUESTERS), m)], None),
+            "supplier": np.where(is_out, None, np.array(SUPPLIERS)[rng.integers(0, len(SUPPLIERS), m)]),
+            "note": "",
+            "bundle_code": codes,
+            "trx_code": codes,
+            "expiry_date": np.where(is_out, None, expiry[pick]),
+            "created_at": created.strftime("%Y-%m-%dT%H:%M:%S"),
+        })
+        done += m
+
+
+def seed(backend, n_items, n_transactions, rng, days=365, zipf_s=1.1, progress=None):
+    """ Isi backend kosong dengan n_items item dan n_transactions transaksi """
+    items = make_items(n_items, rng)
+    now = datetime.now().isoformat()
+    rows = items.astype(object).where(items.notna(), None).to_dict("records")
+    for r in rows:
+        if r["expiry_date"] is not None:
+            r["expiry_date"] = r["expiry_date"].isoformat()
+        r["updated_at"] = now
+    for start in range(0, len(rows), TRX_CHUNK):
+        backend.bulk_upsert_items(rows[start:start + TRX_CHUNK])
+    written = 0
+    for frame in iter_transactions(items, n_transactions, rng, days=days, zipf_s=zipf_s):
+        frame["expiry_date"] = [d.isoformat() if d is not None else None for d in frame["expiry_date"]]
+        backend.insert_transactions(frame.astype(object).where(frame.notna(), None).to_dict("records"))
+        written += len(frame)
+        if progress:
+            progress(written, n_transactions)
+    return items
+
+
+def upload_sheet(items: pd.DataFrame, n, rng, new_share=0.1) -> pd.DataFrame:
+    """ Sheet upload inventaris: campuran item lama (restock) dan item baru """
+    n_new = int(n * new_share)
+    old = items.sample(n=min(n - n_new, len(items)), random_state=int(rng.integers(0, 2**31)))
+    new = make_items(n_new, rng, start=len(items))
+    sheet = pd.concat([old, new], ignore_index=True)
+    sheet["quantity"] = np.round(rng.lognormal(3, 1, len(sheet)))
+    return sheet
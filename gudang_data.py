@@ -0,0 +1,1284 @@
+# gudang_data.py
+# Logika data aplikasi gudang (cache inventaris & transaksi, stok, bundle,
+# import/export, laporan) di atas StorageBackend dari gudang_storage.
+# Modul ini diimpor sekali per proses, jadi state di level modul dipakai bersama
+# oleh semua sesi Streamlit; tidak bergantung pada Streamlit sehingga bisa dipakai
+# dari script/benchmark.
+
+import contextlib
+import contextvars
+import functools
+import gzip
+import os
+import random
+import re
+import hashlib
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pandas.api.extensions import take
+from pandas.api.types import union_categoricals
+
+from gudang_storage import PAGE_SIZE, PREFETCH_PAGES, StorageBackend
+
+# -------------------------
+# Backend aktif
+# -------------------------
+_backend = None
+_backend_lock = threading.Lock()
+
+def use_backend(backend: StorageBackend):
+    """ Pasang backend untuk proses ini. Cache direset kalau database-nya berganti. """
+    global _backend
+    with _backend_lock:
+        changed = _backend is None or _backend.key != backend.key
+        _backend = backend
+    if changed:
+        invalidate_inventory_cache()
+        invalidate_transactions_cache()
+
+def get_backend() -> StorageBackend:
+    if _backend is None:
+        raise RuntimeError("Backend penyimpanan belum dipasang (use_backend)")
+    return _backend
+
+# -------------------------
+# Utility: hashing password
+# -------------------------
+def hash_pw(pw: str) -> str:
+    return hashlib.sha256(pw.encode("utf-8")).hexdigest()
+
+# -------------------------
+# Ensure default admin exists
+# -------------------------
+def ensure_default_admin():
+    backend = get_backend()
+    if not backend.has_users():
+        backend.add_user("admin", hash_pw("admin123"))
+
+# -------------------------
+# Auth
+# -------------------------
+def verify_login(username: str, password: str) -> bool:
+    if not username:
+        return False
+    pw_hash = hash_pw(password)
+    stored = get_backend().get_password_hash(username)
+    if stored is None:
+        return False
+    return stored == pw_hash
+
+def add_user(username: str, password: str):
+    get_backend().add_user(username, hash_pw(password))
+
+# -------------------------
+# Helpers: items & transactions
+# -------------------------
+def generate_trx_code(trx_type: str) -> str:
+    now = datetime.now().strftime('%Y%m%d-%H%M%S')
+    return f"TRX-{trx_type.upper()}-{now}-{random.randint(100,999)}"
+
+# -------------------------
+# Paginated reads
+# -------------------------
+def iter_table_pages(table, columns="*", key="id", after=None, desc=False, filters=None, page_size=None, prefetch=0):
+    """ Generator DataFrame per halaman, urut `key` (harus unik).
+    filters: [(method, column, value)], mis. [("gte", "created_at", "2025-01-01")]
+    prefetch: jumlah potongan key berikutnya yang diambil paralel (hanya Supabase,
+    key integer). """
+    return get_backend().iter_pages(table, columns=columns, key=key, after=after, desc=desc,
+                                    filters=filters, page_size=page_size, prefetch=prefetch)
+
+def read_table(table, **kwargs) -> pd.DataFrame:
+    pages = list(iter_table_pages(table, **kwargs))
+    if not pages:
+        return pd.DataFrame()
+    return pd.concat(pages, ignore_index=True)
+
+# -------------------------
+# Concurrent reads
+# -------------------------
+FETCH_WORKERS = 4  # batas pembacaan independen yang berjalan bersamaan (semua sesi)
+_fetch_pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch")
+
+def fetch_concurrently(*fns):
+    """ Jalankan pembacaan independen bersamaan lalu tunggu semuanya; hasil urut
+    sesuai fns, exception pertama dilempar ulang. Total waktu ~ pembacaan paling
+    lambat, bukan jumlahnya. Fungsi tidak boleh memanggil st.* (thread lain). """
+    futures = [_fetch_pool.submit(contextvars.copy_context().run, fn) for fn in fns]
+    return [f.result() for f in futures]
+
+# -------------------------
+# Inventory snapshot cache (dipakai bersama oleh semua sesi)
+# -------------------------
+INVENTORY_COLUMNS = ["id","name","category","unit","quantity","min_stock","rack_location","expiry_date","created_at","updated_at"]
+INVENTORY_CACHE_TTL = 300  # detik; batas basi untuk perubahan yang dibuat di luar proses ini
+CAS_RETRIES = 5  # percobaan update stok optimistis sebelum menyerah
+IMPORT_CHUNK_SIZE = 1000  # baris per request bulk upsert
+IMPORT_WORKERS = 4  # upsert_item paralel per import saat RPC bulk tidak tersedia
+IMPORT_RETRIES = 5  # percobaan ulang per baris untuk error sementara (429/5xx)
+IMPORT_BACKOFF = 0.5  # detik; jeda dasar backoff eksponensial (dengan jitter)
+IMPORT_BACKOFF_MAX = 8.0
+TRANSACTION_GAP_TTL = 120  # detik; id yang bolong (transaksi belum commit) dicek ulang selama ini
+TRANSACTION_MAX_GAPS = 200
+
+class InventorySnapshot:
+    """ Snapshot tabel items untuk satu proses Streamlit.
+    Setiap penulisan menaikkan `version`, sehingga hasil fetch yang dimulai
+    sebelum penulisan tersebut tidak pernah disimpan. """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fetch_lock = threading.Lock()
+        self.version = 0
+        self.df = None
+        self.loaded_at = 0.0
+        # index hash di atas df: (name, unit) -> item, name -> item pertama, id -> posisi baris
+        self.by_key = {}
+        self.by_name = {}
+        self.pos = {}
+
+    def current(self):
+        with self.lock:
+            if self.df is not None and time.monotonic() - self.loaded_at < INVENTORY_CACHE_TTL:
+                return self.df
+            return None
+
+    def store(self, df, version):
+        with self.lock:
+            if self.version == version:
+                self.df = df
+                self.loaded_at = time.monotonic()
+                self._reindex()
+
+    def invalidate(self):
+        with self.lock:
+            self.version += 1
+            self.df = None
+            self.by_key, self.by_name, self.pos = {}, {}, {}
+
+    def lookup(self, name, unit=None):
+        with self.lock:
+            if self.df is None:
+                return None
+            item = self.by_name.get(name) if unit is None else self.by_key.get((name, unit))
+            return dict(item) if item else None
+
+    def _reindex(self):
+        self.by_key, self.by_name, self.pos = {}, {}, {}
+        for i, row in enumerate(self.df[["id","name","unit","quantity"]].to_dict("records")):
+            self._index_row(row, i)
+
+    def _index_row(self, row, i):
+        item = {
+            "id": row["id"],
+            "name": row["name"],
+            "unit": row["unit"] if isinstance(row["unit"], str) else "",
+            "quantity": float(row["quantity"]) if pd.notna(row["quantity"]) else 0.0,
+        }
+        self.by_key[(item["name"], item["unit"])] = item
+        self.by_name.setdefault(item["name"], item)
+        self.pos[item["id"]] = i
+
+    def patch(self, row):
+        self.patch_many([row])
+
+    def patch_many(self, rows):
+        # update baris yang sama (by id) atau tambahkan item baru ke snapshot.
+        # df yang sudah dibagikan (current()) dibaca tanpa lock, jadi tidak pernah diubah
+        # in-place: patch ditulis ke salinan lalu ditukar di bawah lock
+        with self.lock:
+            self.version += 1
+            if self.df is None or not rows:
+                return
+            new = _normalize_inventory_df(pd.DataFrame(rows))
+            pos = new["id"].map(self.pos)
+            hit = pos.notna()
+            cols = new.columns.intersection(self.df.columns)
+            idx = pos[hit].astype("int64").to_numpy()
+            df = self.df.copy()
+            for col in cols:
+                df.loc[idx, col] = new.loc[hit, col].to_numpy()
+            if not hit.all():
+                if not set(INVENTORY_COLUMNS).issubset(new.columns):
+                    # item baru tapi barisnya sebagian (mis. hanya quantity dari decrement_stock):
+                    # jangan tambahkan dengan metadata kosong, ambil ulang dari DB
+                    self.df = None
+                    self.by_key, self.by_name, self.pos = {}, {}, {}
+                    return
+                self.df = pd.concat([df, new.loc[~hit]], ignore_index=True).sort_values("name", kind="stable", ignore_index=True)
+                self._reindex()
+                return
+            self.df = df
+            for row in rows:
+                old = self.by_key.get((row["name"], row.get("unit") or ""))
+                if old is None or old["id"] != row["id"]:
+                    self._reindex()
+                    return
+                old["quantity"] = float(row.get("quantity") or 0)
+
+_inventory = InventorySnapshot()
+
+def _inventory_snapshot() -> InventorySnapshot:
+    return _inventory
+
+def invalidate_inventory_cache():
+    _inventory_snapshot().invalidate()
+
+def _normalize_inventory_df(df: pd.DataFrame) -> pd.DataFrame:
+    # PostgREST mengirim 5.0 sebagai 5; paksa float supaya patch in-place tidak gagal
+    for col in ("quantity", "min_stock"):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    # Normalize dates
+    if "expiry_date" in df.columns:
+        df["expiry_date"] = pd.to_datetime(df["expiry_date"], errors="coerce").dt.date
+    if "created_at" in df.columns:
+        df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce")
+    return df
+
+def _fetch_inventory_df() -> pd.DataFrame:
+    df = read_table("items", prefetch=PREFETCH_PAGES)
+    if df.empty:
+        return _normalize_inventory_df(pd.DataFrame(columns=INVENTORY_COLUMNS).astype({"id": "int64"}))
+    df = df.sort_values("name", kind="stable", ignore_index=True)
+    return _normalize_inventory_df(df)
+
+def _inventory_snapshot_df() -> pd.DataFrame:
+    """ snapshot bersama (jangan dimodifikasi langsung) """
+    snap = _inventory_snapshot()
+    df = snap.current()
+    if df is not None:
+        return df
+    # hanya satu sesi yang mengambil ulang; sesi lain menunggu hasilnya
+    with snap.fetch_lock:
+        df = snap.current()
+        if df is not None:
+            return df
+        version = snap.version
+        df = _fetch_inventory_df()
+        snap.store(df, version)
+        return df
+
+def get_inventory_df() -> pd.DataFrame:
+    return _inventory_snapshot_df().copy()
+
+def get_items_list():
+    df = _inventory_snapshot_df()
+    if df.empty:
+        return []
+    return df["name"].tolist()
+
+def lookup_item(name, unit=None):
+    """ O(1) lookup {id, name, unit, quantity} dari snapshot; unit=None -> item pertama dengan nama tsb """
+    if not name:
+        return None
+    snap = _inventory_snapshot()
+    if snap.current() is None:
+        _inventory_snapshot_df()
+    return snap.lookup(name, unit)
+
+def check_stock(name, unit, quantity):
+    """ None jika stok cukup; pesan error jika tidak. Snapshot dipakai untuk kasus
+    normal, DB hanya dibaca kalau snapshot menunjukkan masalah (mungkin basi). """
+    found = lookup_item(name, unit)
+    if found and found["quantity"] >= quantity:
+        return None
+    row = get_backend().find_item(name, unit)
+    if row is None:
+        return "Item tidak ditemukan"
+    if (row.get("quantity") or 0) < quantity:
+        return f"Stok: {row.get('quantity')}, diminta: {quantity}"
+    return None
+
+def get_item_unit(name: str):
+    item = lookup_item(name)
+    if not item:
+        return ""
+    return item.get("unit","") or ""
+
+_deferred_patches = contextvars.ContextVar("gudang_deferred_patches", default=None)
+
+def _patch_inventory_cache(rows):
+    # pakai baris yang dikembalikan backend setelah menulis; kalau kosong, buang snapshot
+    pending = _deferred_patches.get()
+    if pending is not None and rows:
+        pending.extend(rows)  # import per baris: dipatch sekali per chunk (lihat _upsert_rows_parallel)
+        return
+    if rows:
+        _inventory_snapshot().patch_many(rows)
+    else:
+        invalidate_inventory_cache()
+
+def _cas_update_item(item, compute, fields, fresh=False):
+    """ Update quantity secara optimistis: hanya berhasil jika quantity di DB masih
+    sama dengan yang kita lihat. compute(existing) -> (new_qty, err). Jika item dari
+    snapshot ternyata basi, baris dibaca ulang by id lalu dicoba lagi. """
+    for _ in range(CAS_RETRIES):
+        existing = item.get("quantity")
+        new_qty, err = compute(existing or 0)
+        if err and fresh:
+            return None, err
+        if not err:
+            row = get_backend().update_item_if_quantity(item["id"], {**fields, "quantity": new_qty}, existing)
+            if row:
+                _patch_inventory_cache([row])
+                return row, None
+        item = get_backend().get_item(item["id"])
+        if item is None:
+            invalidate_inventory_cache()
+            return None, "Item tidak ditemukan"
+        fresh = True
+    return None, "Stok sedang diubah bersamaan, silakan coba lagi"
+
+def upsert_item(name, category, unit, quantity, min_stock=0.0, rack_location="", expiry_date=None, updated_at=None):
+    name = (name or "").strip()
+    now = updated_at or datetime.now().isoformat()
+    # find by name+unit (snapshot dulu; item baru dicek ulang ke DB)
+    item = lookup_item(name, unit)
+    if item is None:
+        item = get_backend().find_item(name, unit)
+    if item:
+        row, err = _cas_update_item(item, lambda existing: (existing + (quantity or 0), None), {
+            "category": category,
+            "min_stock": min_stock,
+            "rack_location": rack_location,
+            "expiry_date": expiry_date.isoformat() if isinstance(expiry_date, (date,)) else expiry_date,
+            "updated_at": now
+        })
+        if err:
+            raise RuntimeError(f"Gagal update {name} ({unit}): {err}")
+        return row["id"]
+    else:
+        row = get_backend().insert_item({
+            "name": name,
+            "category": category,
+            "unit": unit,
+            "quantity": quantity or 0,
+            "min_stock": min_stock or 0,
+            "rack_location": rack_location,
+            "expiry_date": expiry_date.isoformat() if isinstance(expiry_date, (date,)) else expiry_date,
+            "created_at": now,
+            "updated_at": now
+        })
+        _patch_inventory_cache([row])
+        return row["id"]
+
+def adjust_item_for_out(name, unit, quantity):
+    now = datetime.now().isoformat()
+    res = get_backend().decrement_stock(name, unit, quantity, now)
+    if res is None:
+        return _adjust_item_for_out_cas(name, unit, quantity)
+    if res["status"] == "not_found":
+        if lookup_item(name, unit):
+            invalidate_inventory_cache()
+        return None, "Item tidak ditemukan"
+    # quantity dari server selalu terbaru; sinkronkan snapshot
+    _patch_inventory_cache([{"id": res["item_id"], "name": name, "unit": unit, "quantity": res["new_quantity"], "updated_at": now}])
+    if res["status"] == "insufficient":
+        return None, f"Stok tidak cukup: tersedia {res['new_quantity']}"
+    return res["item_id"], None
+
+def _adjust_item_for_out_cas(name, unit, quantity):
+    # fallback tanpa RPC decrement_item_stock: compare-and-swap dari snapshot
+    item = lookup_item(name, unit)
+    fresh = False
+    if item is None:
+        item = get_backend().find_item(name, unit)
+        if item is None:
+            return None, "Item tidak ditemukan"
+        fresh = True
+
+    def compute(existing):
+        if existing < quantity:
+            return None, f"Stok tidak cukup: tersedia {existing}"
+        return existing - quantity, None
+
+    row, err = _cas_update_item(item, compute, {"updated_at": datetime.now().isoformat()}, fresh=fresh)
+    if err:
+        return None, err
+    return row["id"], None
+
+def add_transaction_record(trx_type, item_id, name, quantity, unit, requester, supplier, note, bundle_code, trx_code, expiry_date=None):
+    now = datetime.now().isoformat()
+    get_backend().insert_transactions([{
+        "trx_type": trx_type,
+        "item_id": item_id,
+        "name": name,
+        "quantity": quantity,
+        "unit": unit,
+        "requester": requester,
+        "supplier": supplier,
+        "note": note,
+        "bundle_code": bundle_code,
+        "trx_code": trx_code,
+        "expiry_date": expiry_date.isoformat() if isinstance(expiry_date, (date,)) else expiry_date,
+        "created_at": now
+    }])
+
+def add_transaction_records(rows):
+    """ insert banyak baris transactions dalam satu request; rows berisi argumen add_transaction_record """
+    now = datetime.now().isoformat()
+    payload = []
+    for r in rows:
+        exp = r.get("expiry_date")
+        payload.append({
+            "trx_type": r["trx_type"],
+            "item_id": r.get("item_id"),
+            "name": r.get("name"),
+            "quantity": r.get("quantity"),
+            "unit": r.get("unit"),
+            "requester": r.get("requester"),
+            "supplier": r.get("supplier"),
+            "note": r.get("note"),
+            "bundle_code": r.get("bundle_code"),
+            "trx_code": r.get("trx_code"),
+            "expiry_date": exp.isoformat() if isinstance(exp, (date,)) else exp,
+            "created_at": r.get("created_at") or now
+        })
+    get_backend().insert_transactions(payload)
+
+# -------------------------
+# Bundle (multi-item) commits
+# -------------------------
+def _bundle_key(it):
+    return (it["name"], it["unit"] or "")
+
+def commit_out_bundle(lines, requester):
+    """ Simpan transaksi keluar multi-item sekaligus. lines: [{name, unit, quantity, note}].
+    Return (trx_code, errors); errors = [{line, name, unit, error}] dan trx_code None
+    jika bundle ditolak (tidak ada yang ditulis). """
+    trx_code = generate_trx_code("out")
+    now = datetime.now().isoformat()
+    payload = [{"name": it["name"], "unit": it["unit"], "quantity": it["quantity"], "note": it.get("note", "")} for it in lines]
+    data = get_backend().commit_out_bundle(trx_code, trx_code, requester, payload, now)
+    if data is None:
+        return _commit_out_bundle_rows(payload, requester, trx_code, now)
+    if not data["ok"]:
+        return None, data["errors"]
+    _patch_inventory_cache(data["items"])
+    return trx_code, []
+
+def _restore_stock(item_id, name, unit, quantity):
+    """ kembalikan stok yang sudah dikurangi; return pesan error atau None """
+    item = lookup_item(name, unit) or {"id": item_id, "quantity": None}
+    _, err = _cas_update_item(item, lambda existing: (existing + quantity, None), {"updated_at": datetime.now().isoformat()})
+    return err
+
+def _rollback_out_bundle(done):
+    # semua item dicoba dikembalikan; yang gagal dilaporkan supaya bisa dikoreksi manual
+    failed = []
+    for item_id, name, unit, quantity in reversed(done):
+        try:
+            err = _restore_stock(item_id, name, unit, quantity)
+        except Exception as e:
+            err = f"{type(e).__name__}: {e}"
+        if err:
+            failed.append(f"{name} ({unit}) +{quantity:g}: {err}")
+    if failed:
+        raise RuntimeError("Bundle keluar dibatalkan, tetapi stok berikut belum dikembalikan: " + "; ".join(failed))
+
+def _commit_out_bundle_rows(lines, requester, trx_code, now):
+    # fallback tanpa RPC commit_out_bundle: validasi dengan satu query, kurangi stok
+    # per item (dikembalikan lagi kalau ada yang gagal), insert transaksi sekaligus
+    need = {}
+    for it in lines:
+        need[_bundle_key(it)] = need.get(_bundle_key(it), 0) + it["quantity"]
+    rows = get_backend().find_items({k[0] for k in need})
+    found = {(r["name"], r.get("unit") or ""): r for r in rows}
+
+    def line_errors(keys, message):
+        return [{"line": i, "name": it["name"], "unit": it["unit"], "error": message(it)}
+                for i, it in enumerate(lines) if _bundle_key(it) in keys]
+
+    errors = []
+    for i, it in enumerate(lines):
+        row = found.get(_bundle_key(it))
+        if it["quantity"] <= 0:
+            errors.append({"line": i, "name": it["name"], "unit": it["unit"], "error": "Jumlah harus > 0"})
+        elif row is None:
+            errors.append({"line": i, "name": it["name"], "unit": it["unit"], "error": "Item tidak ditemukan"})
+        elif (row.get("quantity") or 0) < need[_bundle_key(it)]:
+            errors.append({"line": i, "name": it["name"], "unit": it["unit"],
+                           "error": f"Stok: {row.get('quantity')}, diminta: {need[_bundle_key(it)]}"})
+    if errors:
+        return None, errors
+
+    done = []
+    try:
+        for (name, unit), qty in need.items():
+            item_id, err = adjust_item_for_out(name, unit, qty)
+            if err:
+                _rollback_out_bundle(done)
+                return None, line_errors({(name, unit)}, lambda it: err)
+            found[(name, unit)]["id"] = item_id
+            done.append((item_id, name, unit, qty))
+        add_transaction_records([{
+            "trx_type": "out", "item_id": found[_bundle_key(it)]["id"], "name": it["name"], "quantity": it["quantity"],
+            "unit": it["unit"], "requester": requester, "supplier": None, "note": it.get("note", ""),
+            "bundle_code": trx_code, "trx_code": trx_code, "created_at": now
+        } for it in lines])
+    except Exception:
+        _rollback_out_bundle(done)
+        raise
+    return trx_code, []
+
+BUNDLE_IN_COLUMNS = ["name","unit","quantity","category","min_stock","rack_location","expiry_date"]
+
+def commit_in_bundle(lines, supplier, note):
+    """ Simpan transaksi masuk multi-item (mis. 500 baris dari pemasok) dalam satu request.
+    lines: [{name, unit, quantity, category, min_stock, rack_location, expiry_date}],
+    expiry_date boleh berupa teks. Return (trx_code, errors, stats). """
+    t0 = time.perf_counter()
+    trx_code = generate_trx_code("in")
+    now = datetime.now().isoformat()
+    df = pd.DataFrame(lines, columns=BUNDLE_IN_COLUMNS)
+    for col in ("name", "unit"):
+        # key sama dengan upsert_item (spasi tepi dibuang), untuk item maupun baris transaksi
+        df[col] = df[col].fillna("").astype(str).str.strip()
+    for col in ("category", "rack_location"):
+        df[col] = df[col].fillna("")
+    for col in ("quantity", "min_stock"):
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64").fillna(0.0)
+    exp = _parse_dates(df["expiry_date"]).dt.date  # urutan tanggal sama dengan upload (DATE_DAYFIRST)
+    df["expiry_date"] = exp.astype(object).where(exp.notna(), None)
+    payload = _inventory_payload(df)
+
+    mode = "rpc"
+    data = get_backend().commit_in_bundle(trx_code, trx_code, supplier, note, payload, now)
+    if data is None:
+        mode = "row"
+        _commit_in_bundle_rows(df, payload, supplier, note, trx_code, now)
+    elif not data["ok"]:
+        trx_code = None
+    else:
+        _patch_inventory_cache(data["items"])
+    seconds = time.perf_counter() - t0
+    stats = {"lines": len(df), "mode": mode, "seconds": seconds, "lines_per_sec": len(df) / seconds if seconds > 0 else 0.0}
+    return trx_code, (data["errors"] if data and not data["ok"] else []), stats
+
+def _commit_in_bundle_rows(df, payload, supplier, note, trx_code, now):
+    # fallback tanpa RPC commit_in_bundle: upsert item (bulk jika ada) lalu insert transaksi sekaligus
+    merged = _inventory_payload(_merge_duplicate_keys(df))
+    data = get_backend().bulk_upsert_items(merged)
+    if data is not None:
+        _patch_inventory_cache(data)
+        ids = {(r["name"], r.get("unit") or ""): r["id"] for r in data}
+    else:
+        ids = {}
+        for r in merged:
+            ids[_bundle_key(r)] = upsert_item(r["name"], r["category"], r["unit"], r["quantity"], r["min_stock"], r["rack_location"], r["expiry_date"])
+    add_transaction_records([{
+        "trx_type": "in", "item_id": ids.get(_bundle_key(r)), "name": r["name"], "quantity": r["quantity"],
+        "unit": r["unit"], "requester": None, "supplier": supplier, "note": note,
+        "bundle_code": trx_code, "trx_code": trx_code, "expiry_date": r["expiry_date"], "created_at": now
+    } for r in payload])
+
+# -------------------------
+# Load / Export
+# -------------------------
+IMPORT_ERROR_COLUMNS = ["row", "column", "value", "error"]
+DATE_DAYFIRST = True  # tanggal teks tanpa tahun di depan dibaca hari dulu: 02/01/2027 = 2 Januari 2027
+
+# bentuk nilai (angka -> "9"), mis. "99/99/9999" atau "9999-99-99 99:99:99"
+_DATE_SHAPE = re.compile(r"^(9{1,4})([-/.])(9{1,2})\2(9{1,4})(?:([ T])(9{1,2}):(9{2})(?::(9{2}))?(\.9+)?)?$")
+
+@functools.lru_cache(maxsize=256)
+def _date_shape_format(shape):
+    """ Format strptime untuk satu bentuk tanggal numerik, hanya dari bentuknya (bukan
+    dari contoh nilai): diawali 4 digit = tahun-bulan-hari, selain itu mengikuti
+    DATE_DAYFIRST. None jika bentuknya bukan tanggal numerik. """
+    m = _DATE_SHAPE.match(shape)
+    if m is None:
+        return None
+    first, sep, _, last, tsep, _, _, sec, frac = m.groups()
+    if len(first) == 4 and len(last) <= 2:
+        fmt = f"%Y{sep}%m{sep}%d"
+    elif len(first) <= 2 and len(last) in (2, 4):
+        year = "%Y" if len(last) == 4 else "%y"
+        fmt = f"%d{sep}%m{sep}{year}" if DATE_DAYFIRST else f"%m{sep}%d{sep}{year}"
+    else:
+        return None
+    if tsep:
+        fmt += f"{tsep}%H:%M" + (":%S" if sec else "") + (".%f" if frac else "")
+    return fmt
+
+def _parse_dates(values: pd.Series) -> pd.Series:
+    """ Tanggal dari upload atau form -> datetime64. Teks dikelompokkan per bentuk
+    nilai dan setiap kelompok di-parse vektor dengan satu format tetap (urutan
+    DATE_DAYFIRST); teks non-numerik ("1 Jan 2027") lewat format="mixed" dengan urutan
+    yang sama. Nilai date/datetime dipakai apa adanya; yang gagal menjadi NaT. """
+    values = pd.Series(values, dtype=object) if not isinstance(values, pd.Series) else values
+    out = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    is_text = values.map(lambda v: isinstance(v, str), na_action="ignore").fillna(False).astype(bool)
+    if (~is_text).any():
+        out[~is_text] = pd.to_datetime(values[~is_text], errors="coerce")
+    text = values[is_text].astype("string").str.strip()
+    shapes = text.str.replace(r"\d", "9", regex=True)
+    for shape, idx in text.groupby(shapes, sort=False).groups.items():
+        fmt = _date_shape_format(shape)
+        if fmt is not None:
+            out[idx] = pd.to_datetime(text[idx], format=fmt, errors="coerce")
+        else:
+            out[idx] = pd.to_datetime(text[idx], format="mixed", dayfirst=DATE_DAYFIRST, errors="coerce")
+    return out
+
+def _by_unique(values: pd.Series, fn) -> pd.Series:
+    # kolom upload banyak berulang (unit, kategori, tanggal): fn cukup dijalankan per nilai unik
+    codes, uniques = pd.factorize(values)
+    out = fn(pd.Series(uniques, dtype="string"))
+    # code -1 = NA (juga saat kolom kosong semua dan uniques kosong)
+    return pd.Series(take(out.to_numpy(), codes, allow_fill=True), index=values.index)
+
+def _parse_inventory_frame(df: pd.DataFrame, first_row=2):
+    """ Ubah sheet upload menjadi kolom standar, per kolom (bukan per baris).
+    Return (clean, errors): clean = baris valid siap ditulis, errors = satu baris
+    per sel yang ditolak (IMPORT_ERROR_COLUMNS; row = nomor baris di file, header = 1). """
+    df_columns = {str(c).strip().lower(): c for c in df.columns}
+    required = ['name', 'quantity', 'unit']
+    for r in required:
+        if r not in df_columns:
+            raise ValueError(f"Excel harus memiliki kolom: {', '.join(required)}")
+
+    raw = {}  # kolom -> teks asli tanpa spasi tepi ("" = NA), untuk validasi dan tabel error
+    for col in ("name", "unit", "quantity", "category", "min_stock", "rack_location", "expiry_date"):
+        if col in df_columns:
+            raw[col] = df[df_columns[col]].astype("string").str.strip().replace("", pd.NA)
+
+    def text(col):
+        if col not in raw:
+            return pd.Series("", index=df.index)
+        # hanya spasi tepi yang dibuang, sama seperti upsert_item; spasi di tengah bagian dari key
+        return raw[col].fillna("").astype(str)
+
+    def number(col):
+        if col not in raw:
+            return pd.Series(0.0, index=df.index)
+        return _by_unique(raw[col], lambda u: pd.to_numeric(u, errors="coerce")).astype("float64")
+
+    out = pd.DataFrame({
+        "name": text("name"),
+        "unit": text("unit"),
+        "quantity": number("quantity"),
+        "category": text("category"),
+        "min_stock": number("min_stock"),
+        "rack_location": text("rack_location"),
+    })
+    # sel wajib yang kosong, atau sel terisi yang tidak bisa dikonversi
+    missing = {c: raw[c].isna() for c in required}
+    invalid = {"quantity": out["quantity"].isna() & raw["quantity"].notna()}
+    if "min_stock" in raw:
+        invalid["min_stock"] = out["min_stock"].isna() & raw["min_stock"].notna()
+        out["min_stock"] = out["min_stock"].fillna(0.0)
+    out["expiry_date"] = None
+    if "expiry_date" in raw:
+        exp = _by_unique(raw["expiry_date"], _parse_dates).astype("datetime64[ns]")
+        invalid["expiry_date"] = exp.isna() & raw["expiry_date"].notna()
+        exp = exp.dt.date
+        out["expiry_date"] = exp.astype(object).where(exp.notna(), None)
+
+    mask = pd.concat([pd.DataFrame(missing), pd.DataFrame(invalid)], axis=1, keys=["kosong", "bukan"])
+    valid = ~mask.any(axis=1).to_numpy()
+    pos, cell = np.nonzero(mask.to_numpy())
+    kinds, columns = mask.columns.get_level_values(0)[cell], mask.columns.get_level_values(1)[cell]
+    errors = pd.DataFrame({
+        "row": pos + first_row,
+        "column": columns,
+        "value": [raw[c].iat[i] for i, c in zip(pos, columns)],
+        "error": [f"{c} kosong" if k == "kosong" else f"{c} bukan {'tanggal' if c == 'expiry_date' else 'angka'}"
+                  for k, c in zip(kinds, columns)],
+    }, columns=IMPORT_ERROR_COLUMNS).sort_values(["row", "column"], ignore_index=True)
+    errors["value"] = errors["value"].astype(object).where(errors["value"].notna(), None)
+    return out[valid].reset_index(drop=True), errors
+
+def _merge_duplicate_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """ Gabungkan baris dengan (name, unit) sama menjadi satu tulisan, sebelum ke backend:
+    - quantity: dijumlah
+    - category, rack_location: nilai terisi terakhir (urutan file)
+    - min_stock: nilai terbesar (ambang restock paling aman)
+    - expiry_date: tanggal paling awal (stok gabungan dianggap kedaluwarsa duluan) """
+    if not df.duplicated(["name", "unit"]).any():
+        return df
+    work = df.assign(
+        category=df["category"].replace("", pd.NA),
+        rack_location=df["rack_location"].replace("", pd.NA),
+        expiry_date=pd.to_datetime(df["expiry_date"]),
+    )
+    merged = work.groupby(["name", "unit"], sort=False, as_index=False).agg(
+        quantity=("quantity", "sum"),
+        category=("category", "last"),
+        min_stock=("min_stock", "max"),
+        rack_location=("rack_location", "last"),
+        expiry_date=("expiry_date", "min"),
+    )
+    exp = merged["expiry_date"].dt.date
+    return merged.assign(
+        category=merged["category"].fillna(""),
+        rack_location=merged["rack_location"].fillna(""),
+        expiry_date=exp.astype(object).where(exp.notna(), None),
+    )[df.columns]
+
+def _inventory_payload(df: pd.DataFrame) -> list:
+    now = datetime.now().isoformat()
+    rows = df.astype(object).where(df.notna(), None).to_dict("records")
+    for r in rows:
+        if isinstance(r.get("expiry_date"), date):
+            r["expiry_date"] = r["expiry_date"].isoformat()
+        r["updated_at"] = now
+    return rows
+
+def _upsert_import_row(r):
+    """ upsert_item untuk satu baris import, diulang dengan backoff jika error sementara.
+    updated_at baris dipakai sebagai penanda: kalau percobaan yang "gagal" ternyata
+    sudah tersimpan (mis. 504 setelah commit), quantity tidak ditambahkan dua kali. """
+    backend = get_backend()
+    for attempt in range(IMPORT_RETRIES + 1):
+        try:
+            return upsert_item(r["name"], r["category"], r["unit"], r["quantity"], r["min_stock"],
+                               r["rack_location"], r["expiry_date"], updated_at=r["updated_at"])
+        except Exception as e:
+            if attempt == IMPORT_RETRIES or not backend.is_transient(e):
+                raise
+            time.sleep(random.uniform(0, min(IMPORT_BACKOFF_MAX, IMPORT_BACKOFF * 2 ** attempt)))
+            try:
+                item = backend.find_item(r["name"], r["unit"])
+            except Exception as e2:
+                if not backend.is_transient(e2):
+                    raise
+                continue
+            if item and pd.Timestamp(item.get("updated_at") or 0) == pd.Timestamp(r["updated_at"]):
+                _patch_inventory_cache([item])
+                return item["id"]
+
+def _upsert_rows_parallel(rows, workers, on_row=None, skip=()):
+    """ upsert_item per baris di `workers` thread. Baris dibagi (shard) menurut
+    (name, unit), jadi satu key tidak pernah ditulis dua thread sekaligus; latensi
+    request saling tumpang tindih. on_row(i) dipanggil setelah baris ke-i tersimpan;
+    indeks di `skip` (sudah tersimpan sebelumnya) dilewati. """
+    shards = [[] for _ in range(max(1, workers))]
+    for i, r in enumerate(rows):
+        if i not in skip:
+            shards[hash((r["name"], r["unit"])) % len(shards)].append(i)
+    stop = threading.Event()
+
+    def work(shard):
+        for i in shard:
+            if stop.is_set():
+                return
+            try:
+                _upsert_import_row(rows[i])
+            except Exception:
+                stop.set()
+                raise
+            if on_row:
+                on_row(i)
+
+    shards = [sh for sh in shards if sh]
+    # patch snapshot per baris menyalin ulang DataFrame di bawah lock (serial antar thread);
+    # key unik per chunk, jadi cukup dipatch sekali di akhir
+    pending = []
+    token = _deferred_patches.set(pending)
+    try:
+        if len(shards) <= 1:
+            for sh in shards:
+                work(sh)
+            return
+        with ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="import-upsert") as pool:
+            futures = [pool.submit(contextvars.copy_context().run, work, sh) for sh in shards]
+            for f in futures:
+                f.exception()  # tunggu semua selesai sebelum melempar error pertama
+            for f in futures:
+                f.result()
+    finally:
+        _deferred_patches.reset(token)
+        if pending:
+            _patch_inventory_cache(pending)
+
+def upsert_inventory_chunk(rows, use_rpc=True, on_row=None, workers=IMPORT_WORKERS, skip=()) -> str:
+    """ Tulis satu chunk payload (_inventory_payload). Return "rpc" jika lewat satu
+    request bulk_upsert_items (atomik), "row" jika jatuh ke upsert_item per baris
+    (paralel, lihat _upsert_rows_parallel); on_row(i) dipanggil setelah baris ke-i
+    tersimpan di mode row, baris di `skip` dilewati. """
+    if use_rpc:
+        pending = [r for i, r in enumerate(rows) if i not in skip]
+        data = get_backend().bulk_upsert_items(pending) if pending else []
+        if data is not None:
+            _patch_inventory_cache(data)
+            return "rpc"
+    _upsert_rows_parallel(rows, workers, on_row, skip)
+    return "row"
+
+STAMP_LOOKUP_BATCH = 200  # nama per query find_items (panjang URL PostgREST)
+
+def stamped_rows(rows, stamp) -> set:
+    """ Indeks baris payload yang item-nya di DB sudah ber-updated_at `stamp`, artinya
+    sudah tersimpan oleh percobaan sebelumnya dengan stamp yang sama (resume job). """
+    names = list(dict.fromkeys(r["name"] for r in rows))
+    found = {}
+    for start in range(0, len(names), STAMP_LOOKUP_BATCH):
+        for item in get_backend().find_items(names[start:start + STAMP_LOOKUP_BATCH]):
+            found[(item["name"], item.get("unit") or "")] = item.get("updated_at")
+    stamp = pd.Timestamp(stamp)
+    landed = set()
+    for i, r in enumerate(rows):
+        seen = found.get((r["name"], r.get("unit") or ""))
+        if seen is not None and pd.Timestamp(seen) == stamp:
+            landed.add(i)
+    return landed
+
+def bulk_upsert_items(df: pd.DataFrame, chunk_size=IMPORT_CHUNK_SIZE, progress=None, workers=IMPORT_WORKERS) -> dict:
+    """ Tulis baris valid hasil _parse_inventory_frame per chunk lewat RPC bulk_upsert_items
+    (satu request per chunk). Tanpa RPC, jatuh ke upsert_item per baris di `workers` thread. """
+    t0 = time.perf_counter()
+    merged = _merge_duplicate_keys(df)
+    rows = _inventory_payload(merged)
+    mode = "rpc"
+    chunks = 0
+    for start in range(0, len(rows), chunk_size):
+        mode = upsert_inventory_chunk(rows[start:start + chunk_size], use_rpc=mode == "rpc", workers=workers)
+        chunks += 1
+        if progress:
+            progress(min(start + chunk_size, len(rows)), len(rows))
+    seconds = time.perf_counter() - t0
+    return {
+        "rows": len(df),
+        "writes": len(rows),
+        "writes_saved": len(df) - len(rows),
+        "chunks": chunks,
+        "mode": mode,
+        "seconds": seconds,
+        "rows_per_sec": len(df) / seconds if seconds > 0 else 0.0,
+    }
+
+def _excel_engine():
+    # calamine (Rust) jauh lebih cepat dan juga membaca .xls; openpyxl (read-only) sebagai cadangan
+    try:
+        import python_calamine  # noqa: F401
+        return "calamine"
+    except ImportError:
+        return "openpyxl"
+
+EXCEL_ENGINE = _excel_engine()
+
+IMPORT_READ_CHUNK = 100_000  # baris CSV per chunk saat membaca + validasi
+IMPORT_MAX_ERRORS = 10_000  # baris tabel error yang disimpan (jumlah invalid tetap dihitung semua)
+
+def _is_csv(source, name):
+    name = (name or getattr(source, "name", None) or (source if isinstance(source, str) else "")).lower()
+    return name.endswith(".csv")
+
+def read_inventory_file(source, name=None) -> pd.DataFrame:
+    """ Baca file upload (path atau stream) sekali, semua kolom sebagai teks (tanpa
+    inferensi tipe; kode seperti "007" tetap utuh). Konversi tipe dilakukan per kolom
+    di _parse_inventory_frame. CSV dibaca langsung, selain itu dianggap Excel. """
+    if hasattr(source, "seek"):
+        source.seek(0)
+    if _is_csv(source, name):
+        return pd.read_csv(source, dtype=str)
+    return pd.read_excel(source, dtype=str, engine=EXCEL_ENGINE)
+
+def iter_inventory_file(source, name=None, chunksize=IMPORT_READ_CHUNK):
+    """ Seperti read_inventory_file, tapi CSV dibaca per chunk berisi chunksize baris,
+    jadi memori tidak tergantung ukuran file. Yield (frame, fraksi file yang sudah
+    dibaca). Excel (maks. 1 juta baris per sheet) tetap dibaca sekali. """
+    if isinstance(source, pd.DataFrame):
+        yield source, 1.0
+        return
+    if not _is_csv(source, name):
+        yield read_inventory_file(source, name), 1.0
+        return
+    with contextlib.ExitStack() as stack:
+        f = stack.enter_context(open(source, "rb")) if isinstance(source, (str, os.PathLike)) else source
+        f.seek(0, os.SEEK_END)
+        size = f.tell() or 1
+        f.seek(0)
+        for chunk in stack.enter_context(pd.read_csv(f, dtype=str, chunksize=chunksize)):
+            yield chunk, min(f.tell() / size, 1.0)
+
+def prepare_import(source, name=None, progress=None, chunksize=IMPORT_READ_CHUNK) -> dict:
+    """ Baca, validasi dan gabungkan duplikat tanpa menulis apa pun. Return
+    {"rows", "valid", "invalid", "errors", "merged"}; merged = satu baris per (name, unit).
+    File dibaca per chunk dan tiap chunk langsung dilipat ke merged (aturan gabung
+    bersifat asosiatif), jadi memori sebanding dengan jumlah item unik, bukan jumlah
+    baris file. progress(baris_dibaca, fraksi) dipanggil per chunk. """
+    rows = valid = kept = 0
+    errors, parts, pending, merged = [], [], 0, None
+    for chunk, fraction in iter_inventory_file(source, name, chunksize):
+        clean, err = _parse_inventory_frame(chunk, first_row=rows + 2)
+        rows += len(chunk)
+        valid += len(clean)
+        if kept < IMPORT_MAX_ERRORS:
+            errors.append(err.head(IMPORT_MAX_ERRORS - kept))
+            kept += len(errors[-1])
+        parts.append(_merge_duplicate_keys(clean))
+        pending += len(parts[-1])
+        # lipat ulang saat potongan yang belum digabung melebihi hasil gabungan (amortized)
+        if merged is None or pending >= len(merged):
+            merged = _merge_duplicate_keys(pd.concat(([] if merged is None else [merged]) + parts, ignore_index=True))
+            parts, pending = [], 0
+        if progress:
+            progress(rows, fraction)
+    if parts:
+        merged = _merge_duplicate_keys(pd.concat([merged] + parts, ignore_index=True))
+    errors = pd.concat(errors, ignore_index=True) if errors else pd.DataFrame(columns=IMPORT_ERROR_COLUMNS)
+    return {"rows": rows, "valid": valid, "invalid": rows - valid, "errors": errors, "merged": merged}
+
+IMPORT_METADATA_COLUMNS = ["category", "min_stock", "rack_location", "expiry_date"]
+
+def diff_inventory_import(merged: pd.DataFrame) -> pd.DataFrame:
+    """ Dry run: bandingkan hasil prepare_import dengan satu snapshot inventaris lewat
+    merge (name, unit), tanpa lookup per baris. Satu baris per item: status
+    "baru"/"update", stok sekarang, tambahan, stok sesudah import, dan kolom
+    metadata yang akan ditimpa. """
+    inv = _inventory_snapshot_df()[["name", "unit", "quantity"] + IMPORT_METADATA_COLUMNS].drop_duplicates(["name", "unit"])
+    d = merged.merge(inv, on=["name", "unit"], how="left", suffixes=("", "_now"), indicator=True)
+    existing = (d["_merge"] == "both").to_numpy()
+    same = {
+        "category": d["category"] == d["category_now"].fillna("").astype(str),
+        "min_stock": d["min_stock"] == d["min_stock_now"].fillna(0.0),
+        "rack_location": d["rack_location"] == d["rack_location_now"].fillna("").astype(str),
+        "expiry_date": pd.to_datetime(d["expiry_date"]).fillna(pd.Timestamp(0))
+                       == pd.to_datetime(d["expiry_date_now"]).fillna(pd.Timestamp(0)),
+    }
+    changed = pd.Series("", index=d.index)
+    for col in IMPORT_METADATA_COLUMNS:
+        changed = changed.where(same[col].to_numpy() | ~existing, changed + col + ", ")
+    before = d["quantity_now"].fillna(0.0)
+    return pd.DataFrame({
+        "name": d["name"],
+        "unit": d["unit"],
+        "status": np.where(existing, "update", "baru"),
+        "stok_sekarang": before,
+        "tambah": d["quantity"],
+        "stok_sesudah": before + d["quantity"],
+        "metadata_berubah": changed.str.removesuffix(", "),
+    })
+
+def load_inventory(source, name=None, progress=None, workers=IMPORT_WORKERS) -> dict:
+    """ source: DataFrame, path atau stream (CSV/XLSX); returns bulk_upsert_items stats
+    plus "invalid" (baris ditolak) dan "errors" (tabel error per sel) """
+    prepared = prepare_import(source, name)
+    stats = bulk_upsert_items(prepared["merged"], progress=progress, workers=workers)
+    # rows/rows_per_sec dihitung dari baris file (sebelum digabung), bukan dari tulisan
+    seconds = stats["seconds"]
+    stats.update(rows=prepared["valid"], writes_saved=prepared["valid"] - stats["writes"],
+                 rows_per_sec=prepared["valid"] / seconds if seconds > 0 else 0.0,
+                 invalid=prepared["invalid"], errors=prepared["errors"])
+    return stats
+
+def load_inventory_from_excel(buffer, progress=None) -> dict:
+    """ buffer can be file-like or BytesIO from uploaded file; returns bulk_upsert_items stats """
+    return load_inventory(buffer, progress=progress)
+
+EXCEL_MAX_ROWS = 1_048_576  # batas baris per sheet (termasuk header); sisanya ke sheet lanjutan
+
+def _export_pages(table):
+    """ halaman DataFrame untuk export: items urut nama, transactions terbaru dulu """
+    if table == "items":
+        # items muat di memori (snapshot juga begitu): baca urut id, urutkan nama di sini
+        items = read_table("items", prefetch=PREFETCH_PAGES)
+        if not items.empty:
+            items = items.sort_values(["name", "id"], kind="stable", ignore_index=True)
+        return (items.iloc[i:i + PAGE_SIZE] for i in range(0, len(items), PAGE_SIZE))
+    return iter_table_pages("transactions", desc=True, prefetch=PREFETCH_PAGES)
+
+def export_db_to_excel_file(path=None) -> str:
+    """ Tulis seluruh DB ke file .xlsx secara streaming: halaman dibaca satu per
+    satu dan ditulis lewat workbook write-only openpyxl, jadi memori tetap kecil
+    berapa pun jumlah transaksinya. Return path file (default: file temp baru). """
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix="gudang-", suffix=".xlsx")
+        os.close(fd)
+    wb = openpyxl.Workbook(write_only=True)
+    for sheet, table in (("inventory", "items"), ("transactions", "transactions")):
+        ws, columns, rows, part = wb.create_sheet(sheet), None, 0, 1
+        for page in _export_pages(table):
+            if columns is None:
+                columns = list(page.columns)
+                ws.append(columns)
+                rows = 1
+            page = page.reindex(columns=columns)
+            for row in page.astype(object).where(page.notna(), None).itertuples(index=False, name=None):
+                if rows >= EXCEL_MAX_ROWS:
+                    part += 1
+                    ws = wb.create_sheet(f"{sheet}_{part}")
+                    ws.append(columns)
+                    rows = 1
+                ws.append(row)
+                rows += 1
+    wb.save(path)
+    return path
+
+def export_db_to_excel_bytes():
+    path = export_db_to_excel_file()
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+# snapshot kolumnar (Parquet / Arrow IPC) dan CSV gzip, per tabel
+EXPORT_ROW_GROUP = 64_000  # baris per row group Parquet / record batch Arrow
+EXPORT_FORMATS = {
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "arrow": (".arrow", "application/vnd.apache.arrow.file"),
+    "csv.gz": (".csv.gz", "application/gzip"),
+}
+EXPORT_SCHEMAS = {
+    "items": pa.schema([
+        ("id", pa.int64()), ("name", pa.string()), ("category", pa.string()), ("unit", pa.string()),
+        ("quantity", pa.float64()), ("min_stock", pa.float64()), ("rack_location", pa.string()),
+        ("expiry_date", pa.date32()), ("created_at", pa.timestamp("us")), ("updated_at", pa.timestamp("us")),
+    ]),
+    "transactions": pa.schema([
+        ("id", pa.int64()), ("trx_type", pa.string()), ("item_id", pa.int64()), ("name", pa.string()),
+        ("quantity", pa.float64()), ("unit", pa.string()), ("requester", pa.string()), ("supplier", pa.string()),
+        ("note", pa.string()), ("bundle_code", pa.string()), ("trx_code", pa.string()),
+        ("expiry_date", pa.date32()), ("created_at", pa.timestamp("us")),
+    ]),
+}
+
+def _export_table_pages(table, date_from=None, date_to=None):
+    """ items: snapshot penuh; transactions: hanya created_at di [date_from, date_to] """
+    if table == "items":
+        return iter_table_pages("items", prefetch=PREFETCH_PAGES)
+    filters = []
+    if date_from is not None:
+        filters.append(("gte", "created_at", pd.Timestamp(date_from).date().isoformat()))
+    if date_to is not None:
+        filters.append(("lt", "created_at", (pd.Timestamp(date_to).date() + timedelta(days=1)).isoformat()))
+    return iter_table_pages("transactions", filters=filters, prefetch=PREFETCH_PAGES)
+
+def _arrow_table(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    # tipe dari JSON per halaman bisa beda (mis. kolom kosong); paksa ke schema tetap
+    out = {}
+    for field in schema:
+        col = df[field.name] if field.name in df.columns else pd.Series(None, index=df.index, dtype=object)
+        if pa.types.is_timestamp(field.type):
+            col = pd.to_datetime(col, errors="coerce", format="ISO8601")
+        elif pa.types.is_date32(field.type):
+            col = pd.to_datetime(col, errors="coerce", format="ISO8601").dt.date
+        elif pa.types.is_integer(field.type):
+            col = pd.to_numeric(col, errors="coerce").astype("Int64")
+        elif pa.types.is_floating(field.type):
+            col = pd.to_numeric(col, errors="coerce").astype("float64")
+        else:
+            col = col.astype(object).where(col.notna(), None)
+        out[field.name] = pa.array(col, type=field.type, from_pandas=True)
+    return pa.Table.from_pydict(out, schema=schema)
+
+def _row_groups(pages, size):
+    """ gabungkan halaman kecil (PAGE_SIZE) menjadi blok sekitar `size` baris """
+    buf, n = [], 0
+    for page in pages:
+        buf.append(page)
+        n += len(page)
+        if n >= size:
+            yield pd.concat(buf, ignore_index=True)
+            buf, n = [], 0
+    if buf:
+        yield pd.concat(buf, ignore_index=True)
+
+def export_table_file(table, fmt, date_from=None, date_to=None, path=None, row_group_size=EXPORT_ROW_GROUP) -> str:
+    """ Tulis tabel `items` atau `transactions` ke file `fmt` (lihat EXPORT_FORMATS)
+    secara streaming: halaman dibaca lalu ditulis per row group, jadi memori
+    dibatasi row_group_size, bukan ukuran tabel. Return path file. """
+    ext, _ = EXPORT_FORMATS[fmt]
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix=f"gudang-{table}-", suffix=ext)
+        os.close(fd)
+    pages = _export_table_pages(table, date_from, date_to)
+    schema = EXPORT_SCHEMAS[table]
+    if fmt == "csv.gz":
+        with gzip.open(path, "wt", newline="", encoding="utf-8") as f:
+            header = True
+            for page in pages:
+                page.reindex(columns=schema.names).to_csv(f, header=header, index=False)
+                header = False
+            if header:
+                f.write(",".join(schema.names) + "\n")
+        return path
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(path, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_file(path, schema)
+    with writer:
+        for block in _row_groups(pages, row_group_size):
+            tbl = _arrow_table(block, schema)
+            if fmt == "parquet":
+                writer.write_table(tbl, row_group_size=row_group_size)
+            else:
+                writer.write_table(tbl, max_chunksize=row_group_size)
+    return path
+
+# -------------------------
+# Reporting helpers
+# -------------------------
+class TransactionCache:
+    """ Salinan tabel transactions di memori proses. History hanya bertambah, jadi
+    setiap load cukup mengambil baris dengan id > last_id lalu menambahkannya. """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.df = None
+        self.last_id = 0
+        # id di bawah last_id yang belum terlihat: transaksi yang commit belakangan
+        # (atau sequence yang terlewati karena rollback) -> {id: pertama kali terlihat}
+        self.gaps = {}
+
+_transactions = TransactionCache()
+
+def _transaction_cache() -> TransactionCache:
+    return _transactions
+
+def invalidate_transactions_cache():
+    cache = _transaction_cache()
+    with cache.lock:
+        cache.df, cache.last_id, cache.gaps = None, 0, {}
+
+# kolom teks berulang (kardinalitas rendah dibanding jumlah baris) disimpan sebagai kode kategori
+TRANSACTION_CATEGORIES = ["trx_type","name","unit","requester","supplier","note","bundle_code","trx_code"]
+TRANSACTION_KEY_COLUMNS = ["day","week","month"]
+
+def day_key(value) -> int:
+    """ tanggal -> jumlah hari sejak 1970-01-01 (kunci kolom `day`) """
+    return int(pd.Timestamp(value).normalize().value // 86_400_000_000_000)
+
+def _compact_transactions(df: pd.DataFrame) -> pd.DataFrame:
+    """ Representasi kolumnar ringkas untuk history transaksi: teks -> category,
+    quantity float32, created_at datetime64 (epoch int64) dan kunci periode integer:
+    day (hari sejak epoch), week (YYYYWW, minggu '%Y-%W') dan month (YYYYMM). """
+    out = pd.DataFrame(index=df.index)
+    out["id"] = df["id"].astype("int64")
+    for col in df.columns:
+        if col in TRANSACTION_CATEGORIES:
+            # satu dtype teks tetap: kolom yang semuanya None jangan jadi kategori object,
+            # union_categoricals menolak campuran dtype kategori. "string" (bukan "str")
+            # supaya None tetap NA juga di pandas 2, bukan teks "None"
+            out[col] = df[col].astype("string").astype("category")
+    if "item_id" in df.columns:
+        out["item_id"] = pd.to_numeric(df["item_id"], errors="coerce").astype("Int64")
+    out["quantity"] = pd.to_numeric(df["quantity"], errors="coerce").astype("float32")
+    if "expiry_date" in df.columns:
+        out["expiry_date"] = pd.to_datetime(df["expiry_date"], errors="coerce", format="ISO8601")
+    created = pd.to_datetime(df["created_at"], errors="coerce", format="ISO8601")
+    out["created_at"] = created
+    valid = created.notna()
+    # NaT -> -1; baris tanpa tanggal tidak ikut filter/rekap periode
+    out["day"] = created.to_numpy().astype("datetime64[D]").astype("int64")
+    out["week"] = (created.dt.year * 100 + (created.dt.dayofyear - 1 + 7 - created.dt.dayofweek) // 7)
+    out["month"] = created.dt.year * 100 + created.dt.month
+    for col in TRANSACTION_KEY_COLUMNS:
+        out[col] = out[col].where(valid, -1).astype("int32")
+    return out
+
+def _append_transactions(old, new):
+    if old is None:
+        return new
+    df = pd.concat([old, new], ignore_index=True)
+    # concat kategori dengan daftar kategori berbeda menghasilkan object; gabungkan kodenya
+    for col in TRANSACTION_CATEGORIES:
+        if col in old.columns and col in new.columns:
+            df[col] = union_categoricals([old[col], new[col]])
+    return df
+
+def transactions_between(df: pd.DataFrame, date_from=None, date_to=None) -> pd.DataFrame:
+    """ baris dengan tanggal created_at di [date_from, date_to], lewat kunci integer `day` """
+    mask = df["day"] >= 0
+    if date_from is not None:
+        mask &= df["day"] >= day_key(date_from)
+    if date_to is not None:
+        mask &= df["day"] <= day_key(date_to)
+    return df.loc[mask]
+
+def _fetch_new_transactions(cache: TransactionCache) -> list:
+    pages = []
+    now = time.monotonic()
+    cache.gaps = {i: t for i, t in cache.gaps.items() if now - t < TRANSACTION_GAP_TTL}
+    if cache.gaps:
+        pages.append(read_table("transactions", filters=[("in_", "id", list(cache.gaps))]))
+    # load pertama mengambil seluruh history -> prefetch paralel; selanjutnya hanya ekornya
+    prefetch = PREFETCH_PAGES if cache.df is None else 0
+    pages.extend(iter_table_pages("transactions", after=cache.last_id, prefetch=prefetch))
+    return [p for p in pages if not p.empty]
+
+def load_transactions_df():
+    cache = _transaction_cache()
+    with cache.lock:
+        pages = _fetch_new_transactions(cache)
+        if pages:
+            new = _compact_transactions(pd.concat(pages, ignore_index=True))
+            seen = set(new["id"])
+            top = int(new["id"].max())
+            # lubang hanya dilacak setelah load pertama, dan dibatasi jumlahnya
+            if cache.df is not None and top - cache.last_id - len(seen) <= TRANSACTION_MAX_GAPS:
+                for missing in range(cache.last_id + 1, top):
+                    if missing not in seen:
+                        cache.gaps.setdefault(missing, time.monotonic())
+            for found in seen:
+                cache.gaps.pop(found, None)
+            df = _append_transactions(cache.df, new)
+            if not df["created_at"].is_monotonic_increasing:
+                df = df.sort_values("created_at", kind="stable", ignore_index=True)
+            cache.df = df
+            cache.last_id = max(cache.last_id, top)
+        df = cache.df
+    if df is None:
+        return pd.DataFrame()
+    return df.copy()
+
+def rebuild_daily_rollup():
+    """ Backfill rollup transactions_daily dari seluruh history; None jika migrasi 006 belum dipasang """
+    return get_backend().rebuild_daily_rollup()
+
+def _iso_date(value):
+    if value is None or pd.isna(value):
+        return None
+    return pd.Timestamp(value).date().isoformat()
+
+def totals_for_period(df, period, date_from=None, date_to=None):
+    """ Total quantity per periode ('W' atau 'M'), item, satuan dan trx_type.
+    Dihitung di database (rollup transactions_daily; di Supabase lewat RPC
+    transaction_totals); df hanya dipakai jika RPC belum dipasang (None -> load_transactions_df). """
+    label = {"W": "week", "M": "month"}.get(period)
+    if label is None:
+        return pd.DataFrame()
+
+    data = get_backend().transaction_totals(period, _iso_date(date_from), _iso_date(date_to))
+    if data is not None:
+        if not data:
+            return pd.DataFrame()
+        return pd.DataFrame(data).rename(columns={"period": label})
+
+    if df is None:
+        df = load_transactions_df()
+    if df.empty:
+        return pd.DataFrame()
+
+    # groupby di atas kunci integer dan kode kategori; label '%Y-%W' / '%Y-%m' hanya untuk hasil
+    rows = transactions_between(df, date_from, date_to)
+    g = rows.groupby([label, 'name', 'unit', 'trx_type'], observed=True, sort=True)['quantity'].sum().reset_index()
+    g[label] = (g[label] // 100).astype(str) + "-" + (g[label] % 100).astype(str).str.zfill(2)
+    for col in ('name', 'unit', 'trx_type'):
+        g[col] = g[col].astype(object)
+    g['quantity'] = g['quantity'].astype("float64")
+    return g
+
+def recent_transactions_df(limit=20) -> pd.DataFrame:
+    return pd.DataFrame(get_backend().recent_transactions(limit))
+
+# -------------------------
+# Admin
+# -------------------------
+def reset_database():
+    get_backend().reset()
+    invalidate_inventory_cache()
+    invalidate_transactions_cache()
@@ -0,0 +1,207 @@
+# gudang_jobs.py
+# Import inventaris sebagai job latar belakang. File upload di-parse sekali lalu
+# disimpan ke folder job (rows.parquet + state.json); thread pool menulisnya per
+# chunk dan mencatat posisi commit terakhir di state.json. Job tetap jalan walau
+# browser di-refresh (job id ada di URL), dan job yang gagal/terputus bisa
+# dilanjutkan dari chunk (atau baris, di mode per baris) terakhir yang sudah ter-commit.
+# Setiap chunk ditulis dengan updated_at yang sama (chunk_stamp, dicatat sebelum
+# dikirim); saat resume, baris yang di DB sudah membawa stamp itu dilewati.
+
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+import gudang_data as gd
+
+JOBS_DIR = os.environ.get("GUDANG_JOBS_DIR") or os.path.join(tempfile.gettempdir(), "gudang-import-jobs")
+JOB_WORKERS = 2  # import yang berjalan bersamaan (semua sesi)
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+_lock = threading.Lock()
+_running = set()  # job id yang sedang dikerjakan thread di proses ini
+_pool = None
+
+
+def _job_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="gudang-import")
+        return _pool
+
+
+def _job_dir(job_id):
+    return os.path.join(JOBS_DIR, job_id)
+
+
+def _save_state(state):
+    # tulis atomik: pembaca (fragment progress) tidak pernah melihat file setengah jadi
+    state["updated_at"] = datetime.now().isoformat(timespec="seconds")
+    path = os.path.join(_job_dir(state["id"]), "state.json")
+    fd, tmp = tempfile.mkstemp(dir=_job_dir(state["id"]), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def _load_state(job_id):
+    try:
+        with open(os.path.join(_job_dir(job_id), "state.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def get_job(job_id) -> dict:
+    """ State job, atau None jika tidak ada. Job "running" yang tidak sedang
+    dikerjakan di proses ini (mis. server restart) dilaporkan "interrupted". """
+    if not job_id or os.sep in job_id or job_id.startswith("."):
+        return None
+    state = _load_state(job_id)
+    if state is None:
+        return None
+    with _lock:
+        active = job_id in _running
+    if state["status"] in ("queued", "running") and not active:
+        state["status"] = "interrupted"
+    return state
+
+
+def get_job_errors(job_id) -> pd.DataFrame:
+    """ Tabel baris yang ditolak saat parse (gd.IMPORT_ERROR_COLUMNS) """
+    try:
+        return pd.read_csv(os.path.join(_job_dir(job_id), "errors.csv"), dtype={"value": str})
+    except OSError:
+        return pd.DataFrame(columns=gd.IMPORT_ERROR_COLUMNS)
+
+
+def list_jobs(limit=10) -> list:
+    """ Job terbaru dulu """
+    try:
+        ids = os.listdir(JOBS_DIR)
+    except OSError:
+        return []
+    jobs = [j for j in (get_job(i) for i in ids) if j is not None]
+    jobs.sort(key=lambda j: j["created_at"], reverse=True)
+    return jobs[:limit]
+
+
+def submit_import(source, name=None, chunk_size=gd.IMPORT_CHUNK_SIZE, prepared=None, workers=gd.IMPORT_WORKERS) -> str:
+    """ Parse file upload sekarang (kesalahan format langsung terlihat), simpan
+    barisnya ke folder job, lalu tulis ke database di latar belakang. Return job id.
+    prepared: hasil gd.prepare_import yang sudah ada (mis. dari dry run).
+    workers: upsert paralel jika RPC bulk tidak tersedia. """
+    if prepared is None:
+        prepared = gd.prepare_import(source, name)
+    merged = prepared["merged"]
+
+    job_id = uuid.uuid4().hex[:12]
+    os.makedirs(_job_dir(job_id))
+    merged.to_parquet(os.path.join(_job_dir(job_id), "rows.parquet"), index=False)
+    prepared["errors"].to_csv(os.path.join(_job_dir(job_id), "errors.csv"), index=False)
+    state = {
+        "id": job_id,
+        "file_name": name or getattr(source, "name", None),
+        "status": "queued",
+        "rows": prepared["valid"],
+        "invalid": prepared["invalid"],
+        "total": len(merged),
+        "writes_saved": prepared["valid"] - len(merged),
+        "committed": 0,
+        "partial": [],
+        "chunk_size": int(chunk_size),
+        "workers": int(workers),
+        "mode": "rpc",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "seconds": 0.0,
+        "rows_per_sec": 0.0,
+        "error": None,
+    }
+    _save_state(state)
+    _start(state)
+    return job_id
+
+
+def resume_job(job_id) -> bool:
+    """ Lanjutkan job gagal/terputus dari baris terakhir yang sudah ter-commit """
+    state = get_job(job_id)
+    if state is None or state["status"] not in ("failed", "interrupted"):
+        return False
+    state.update(status="queued", error=None)
+    _save_state(state)
+    return _start(state)
+
+
+def _start(state) -> bool:
+    with _lock:
+        if state["id"] in _running:
+            return False
+        _running.add(state["id"])
+    # sengaja tanpa copy_context: job hidup lebih lama dari rerun, jangan isi trace debug
+    _job_pool().submit(_run, state)
+    return True
+
+
+def _run(state):
+    try:
+        merged = pd.read_parquet(os.path.join(_job_dir(state["id"]), "rows.parquet"))
+        merged["expiry_date"] = merged["expiry_date"].astype(object).where(merged["expiry_date"].notna(), None)
+        state["status"] = "running"
+        state.setdefault("partial", [])
+        _save_state(state)
+        chunk_size = state["chunk_size"]
+        t0 = time.perf_counter() - state["seconds"]
+        lock = threading.Lock()
+
+        def save_progress():
+            written = state["committed"] + len(state["partial"])
+            state["seconds"] = time.perf_counter() - t0
+            # item (setelah baris duplikat digabung) per detik, sama dengan committed/total
+            state["rows_per_sec"] = written / state["seconds"] if state["seconds"] > 0 else 0.0
+            _save_state(state)
+
+        while state["committed"] < state["total"]:
+            start = state["committed"]
+            rows = gd._inventory_payload(merged.iloc[start:start + chunk_size])
+            # baris chunk ini yang sudah tersimpan (mode row, urutan selesai acak karena paralel);
+            # disimpan per baris supaya resume tidak menambah quantity dua kali
+            done = set(state["partial"])
+            if state.get("chunk_start") == start:
+                # resume: proses bisa mati setelah DB commit tapi sebelum state tersimpan;
+                # baris yang di DB sudah membawa stamp chunk ini jangan ditulis lagi
+                done |= gd.stamped_rows(rows, state["chunk_stamp"])
+            else:
+                # stamp updated_at dicatat sebelum mengirim, supaya resume bisa mengenalinya
+                state.update(chunk_start=start, chunk_stamp=rows[0]["updated_at"] if rows else None)
+                _save_state(state)
+            for r in rows:
+                r["updated_at"] = state["chunk_stamp"]
+
+            def row_done(i):
+                with lock:
+                    done.add(i)
+                    state["partial"] = sorted(done)
+                    save_progress()
+
+            state["mode"] = gd.upsert_inventory_chunk(
+                rows, use_rpc=state["mode"] == "rpc", on_row=row_done,
+                workers=state.get("workers", gd.IMPORT_WORKERS), skip=frozenset(done))
+            with lock:
+                state["committed"] = start + len(rows)
+                state["partial"] = []
+                save_progress()
+        state["status"] = "done"
+    except Exception as e:
+        state["status"] = "failed"
+        state["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        _save_state(state)
+        with _lock:
+            _running.discard(state["id"])
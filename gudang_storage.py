@@ -0,0 +1,760 @@
+# gudang_storage.py
+# Lapisan penyimpanan aplikasi gudang: satu interface, dua implementasi.
+#  - SupabaseBackend: PostgREST + RPC dari folder migrations/
+#  - SQLiteBackend: database lokal (satu file) untuk gudang satu lokasi tanpa
+#    jaringan, benchmark dan profiling offline.
+# Modul ini tidak bergantung pada Streamlit.
+
+import contextvars
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pandas as pd
+from postgrest.exceptions import APIError
+from supabase import create_client, Client
+from supabase.lib.client_options import SyncClientOptions
+
+from gudang_trace import TracedClient, record
+
+# PostgREST memotong setiap response di max-rows (default Supabase 1000), jadi
+# PAGE_SIZE tidak boleh lebih besar dari setting itu.
+PAGE_SIZE = 1000
+PREFETCH_PAGES = 4
+RPC_RECHECK_SECONDS = 600  # RPC yang belum dipasang dicek ulang setelah ini
+
+
+class StorageBackend:
+    """ Operasi penyimpanan yang dipakai gudang_data.
+    Method opsional yang mengembalikan None berarti operasi itu tidak tersedia di
+    backend ini (mis. RPC belum dipasang); pemanggil lalu memakai jalur fallback. """
+
+    name = "base"
+    key = ""  # identitas database; cache di gudang_data direset kalau berubah
+
+    # --- users ---
+    def has_users(self) -> bool:
+        raise NotImplementedError
+
+    def get_password_hash(self, username):
+        raise NotImplementedError
+
+    def add_user(self, username, password_hash):
+        raise NotImplementedError
+
+    # --- baca per halaman ---
+    def iter_pages(self, table, columns="*", key="id", after=None, desc=False, filters=None, page_size=None, prefetch=0):
+        """ Generator DataFrame per halaman, urut `key` (kolom unik; prefetch butuh key integer).
+        filters: [(method, column, value)] dengan method eq/neq/gt/gte/lt/lte/in_ """
+        raise NotImplementedError
+
+    # --- items ---
+    def find_item(self, name, unit):
+        raise NotImplementedError
+
+    def get_item(self, item_id):
+        raise NotImplementedError
+
+    def find_items(self, names) -> list:
+        """ id, name, unit, quantity, updated_at untuk semua item dengan nama di `names` """
+        raise NotImplementedError
+
+    def insert_item(self, fields) -> dict:
+        raise NotImplementedError
+
+    def update_item_if_quantity(self, item_id, fields, expected_quantity):
+        """ Update hanya jika quantity di DB masih `expected_quantity`; baris baru atau None """
+        raise NotImplementedError
+
+    def bulk_upsert_items(self, rows):
+        return None
+
+    def decrement_stock(self, name, unit, quantity, now):
+        """ {item_id, new_quantity, status: ok/insufficient/not_found} """
+        return None
+
+    # --- transactions ---
+    def insert_transactions(self, rows):
+        raise NotImplementedError
+
+    def recent_transactions(self, limit) -> list:
+        raise NotImplementedError
+
+    def commit_out_bundle(self, bundle_code, trx_code, requester, lines, now):
+        """ {ok, errors: [{line, name, unit, error}], items: [baris items]} """
+        return None
+
+    def commit_in_bundle(self, bundle_code, trx_code, supplier, note, lines, now):
+        return None
+
+    def transaction_totals(self, period, date_from, date_to):
+        """ [{period, name, unit, trx_type, quantity}] dari rollup harian """
+        return None
+
+    def rebuild_daily_rollup(self):
+        return None
+
+    # --- admin ---
+    def reset(self):
+        raise NotImplementedError
+
+    def is_transient(self, exc) -> bool:
+        """ True jika kegagalan ini sementara (rate limit, server sibuk, koneksi putus)
+        dan operasinya boleh dicoba ulang """
+        return False
+
+
+# -------------------------
+# Supabase (PostgREST)
+# -------------------------
+SUPABASE_POOL_SIZE = 20  # koneksi keep-alive per proses; >= FETCH_WORKERS + PREFETCH_PAGES
+SUPABASE_TIMEOUT = 30.0  # detik per request
+SUPABASE_CONNECT_TIMEOUT = 5.0
+SUPABASE_KEEPALIVE_EXPIRY = 60.0  # koneksi idle ditutup setelah ini
+
+
+def make_supabase_client(url, key, pool_size=SUPABASE_POOL_SIZE, timeout=SUPABASE_TIMEOUT,
+                         connect_timeout=SUPABASE_CONNECT_TIMEOUT, keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY,
+                         http2=True) -> Client:
+    """ Client Supabase di atas satu httpx.Client dengan pool koneksi keep-alive.
+    Buat sekali per proses lalu pakai bersama oleh semua sesi/thread; HTTP/2
+    (multiplexing) dipakai kalau paket h2 terpasang. """
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            http2 = False
+    http = httpx.Client(
+        http2=http2,
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                            keepalive_expiry=keepalive_expiry),
+        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        follow_redirects=True,
+    )
+    return create_client(url, key, options=SyncClientOptions(httpx_client=http, postgrest_client_timeout=timeout))
+
+# HTTP status (response tanpa JSON: APIError.code = status) dan kode error PostgREST /
+# Postgres yang aman dicoba ulang: rate limit, gateway/DB sibuk, konflik serialisasi
+TRANSIENT_HTTP_STATUS = {429, 500, 502, 503, 504, 520}
+TRANSIENT_ERROR_CODES = {"PGRST000", "PGRST001", "PGRST002", "PGRST003", "40001", "40P01", "53300", "57014"}
+
+_missing_rpcs = {}  # (url, fungsi) -> waktu terakhir ditemukan hilang
+_prefetch_pool = None
+_prefetch_lock = threading.Lock()
+
+
+def prefetch_pool() -> ThreadPoolExecutor:
+    global _prefetch_pool
+    with _prefetch_lock:
+        if _prefetch_pool is None:
+            _prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_PAGES, thread_name_prefix="page-prefetch")
+        return _prefetch_pool
+
+
+class SupabaseBackend(StorageBackend):
+    name = "supabase"
+
+    def __init__(self, client):
+        # setiap .execute() dicatat ke trace rerun yang aktif (lihat gudang_trace)
+        self.client = TracedClient(client)
+        self.key = f"supabase:{getattr(client, 'supabase_url', '')}"
+
+    def _rpc(self, fn, params, page_size=None):
+        """ Data hasil RPC, atau None kalau fungsi belum dipasang (lihat migrations/).
+        Fungsi yang hilang diingat sebentar supaya tidak dicoba di setiap rerun.
+        page_size: hasil set-returning diambil per halaman lewat .range() (max-rows). """
+        memo = (self.key, fn)
+        if time.monotonic() - _missing_rpcs.get(memo, -RPC_RECHECK_SECONDS) < RPC_RECHECK_SECONDS:
+            return None
+        try:
+            if not page_size:
+                return self.client.rpc(fn, params).execute().data
+            rows = []
+            while True:
+                page = self.client.rpc(fn, params).range(len(rows), len(rows) + page_size - 1).execute().data or []
+                rows.extend(page)
+                if len(page) < page_size:
+                    return rows
+        except APIError as e:
+            # PGRST202: fungsi tidak ada di schema cache PostgREST
+            if e.code in ("PGRST202", "42883"):
+                _missing_rpcs[memo] = time.monotonic()
+                return None
+            raise
+
+    # --- users ---
+    def has_users(self):
+        q = self.client.table("users").select("username").limit(1).execute()
+        return bool(q.data)
+
+    def get_password_hash(self, username):
+        q = self.client.table("users").select("password_hash").eq("username", username).limit(1).execute()
+        if not q.data:
+            return None
+        return q.data[0].get("password_hash")
+
+    def add_user(self, username, password_hash):
+        self.client.table("users").insert({"username": username, "password_hash": password_hash}).execute()
+
+    # --- baca per halaman ---
+    def _page_query(self, table, columns, filters):
+        q = self.client.table(table).select(columns)
+        for method, column, value in filters or []:
+            q = getattr(q, method)(column, value)
+        return q
+
+    def iter_pages(self, table, columns="*", key="id", after=None, desc=False, filters=None, page_size=None, prefetch=0):
+        """ Keyset (key > nilai terakhir); prefetch>0 membagi rentang key menjadi
+        potongan yang diambil paralel (lihat _iter_key_ranges). Tanpa OFFSET. """
+        page_size = page_size or PAGE_SIZE
+        if prefetch:
+            yield from self._iter_key_ranges(table, columns, key, after, desc, filters, page_size, prefetch)
+            return
+        for rows in self._iter_keyset(table, columns, key, after, desc, filters, page_size):
+            yield pd.DataFrame(rows)
+
+    def _iter_keyset(self, table, columns, key, after, desc, filters, page_size, start=None, stop=None):
+        # halaman urut key; start/stop membatasi ke potongan key >= start AND key < stop
+        last = after
+        while True:
+            q = self._page_query(table, columns, filters)
+            if start is not None:
+                q = q.gte(key, start).lt(key, stop)
+            if last is not None:
+                q = q.lt(key, last) if desc else q.gt(key, last)
+            rows = q.order(key, desc=desc).range(0, page_size - 1).execute().data or []
+            if rows:
+                yield rows
+            if len(rows) < page_size:
+                return
+            last = rows[-1][key]
+
+    def _iter_key_ranges(self, table, columns, key, after, desc, filters, page_size, prefetch):
+        """ Prefetch untuk key integer unik (id). Batas [lo, hi] dibaca sekali di awal,
+        lalu dibagi menjadi potongan key (key >= a AND key < b); `prefetch` potongan
+        berikutnya diambil paralel, di dalam potongan dengan keyset. Biaya per request
+        tetap (tanpa OFFSET) dan insert/delete selama pembacaan tidak menggeser
+        halaman lain; baris dengan key > hi (masuk setelah mulai) tidak ikut. """
+        def bound(highest):
+            q = self._page_query(table, key, filters)
+            if after is not None:
+                q = q.lt(key, after) if desc else q.gt(key, after)
+            rows = q.order(key, desc=highest).limit(1).execute().data
+            return rows[0][key] if rows else None
+
+        lo = bound(False)
+        if lo is None:
+            return
+        hi = bound(True)
+        cursor = hi + 1 if desc else lo
+        width = page_size  # id unik: potongan selebar page_size muat dalam satu halaman
+
+        def next_range():
+            nonlocal cursor
+            if desc:
+                if cursor <= lo:
+                    return None
+                a, b = max(cursor - width, lo), cursor
+                cursor = a
+            else:
+                if cursor > hi:
+                    return None
+                a, b = cursor, min(cursor + width, hi + 1)
+                cursor = b
+            return a, b
+
+        def fetch(a, b):
+            rows = [r for page in self._iter_keyset(table, columns, key, None, desc, filters, page_size, a, b) for r in page]
+            return rows, b - a
+
+        pool = prefetch_pool()
+        pending = []
+
+        def submit():
+            rng = next_range()
+            if rng is not None:
+                # copy_context: trace rerun ikut ke thread prefetch
+                pending.append(pool.submit(contextvars.copy_context().run, fetch, *rng))
+
+        for _ in range(prefetch + 1):
+            submit()
+        while pending:
+            rows, span = pending.pop(0).result()
+            if rows:
+                yield pd.DataFrame(rows)
+            # id jarang (banyak yang terhapus): lebarkan potongan berikutnya
+            density = len(rows) / span
+            width = min(page_size * 64, max(page_size, int(page_size / max(density, 1 / 64))))
+            submit()
+
+    # --- items ---
+    def find_item(self, name, unit):
+        res = self.client.table("items").select("*").eq("name", name).eq("unit", unit).limit(1).execute()
+        return res.data[0] if res.data else None
+
+    def get_item(self, item_id):
+        res = self.client.table("items").select("*").eq("id", item_id).limit(1).execute()
+        return res.data[0] if res.data else None
+
+    def find_items(self, names):
+        res = self.client.table("items").select("id,name,unit,quantity,updated_at").in_("name", list(names)).execute()
+        return res.data or []
+
+    def insert_item(self, fields):
+        return self.client.table("items").insert(fields).execute().data[0]
+
+    def update_item_if_quantity(self, item_id, fields, expected_quantity):
+        q = self.client.table("items").update(fields).eq("id", item_id)
+        q = q.eq("quantity", expected_quantity) if expected_quantity is not None else q.is_("quantity", "null")
+        upd = q.execute()
+        return upd.data[0] if upd.data else None
+
+    def bulk_upsert_items(self, rows):
+        return self._rpc("bulk_upsert_items", {"rows": rows})
+
+    def decrement_stock(self, name, unit, quantity, now):
+        data = self._rpc("decrement_item_stock", {"p_name": name, "p_unit": unit, "p_quantity": quantity, "p_updated_at": now})
+        if data is None:
+            return None
+        return data[0] if data else {"item_id": None, "new_quantity": None, "status": "not_found"}
+
+    # --- transactions ---
+    def insert_transactions(self, rows):
+        if rows:
+            self.client.table("transactions").insert(rows).execute()
+
+    def recent_transactions(self, limit):
+        q = self.client.table("transactions").select("*").order("created_at", desc=True).limit(limit).execute()
+        return q.data or []
+
+    def commit_out_bundle(self, bundle_code, trx_code, requester, lines, now):
+        return self._rpc("commit_out_bundle", {
+            "p_bundle_code": bundle_code,
+            "p_trx_code": trx_code,
+            "p_requester": requester,
+            "p_lines": lines,
+            "p_created_at": now
+        })
+
+    def commit_in_bundle(self, bundle_code, trx_code, supplier, note, lines, now):
+        return self._rpc("commit_in_bundle", {
+            "p_bundle_code": bundle_code,
+            "p_trx_code": trx_code,
+            "p_supplier": supplier,
+            "p_note": note,
+            "p_lines": lines,
+            "p_created_at": now
+        })
+
+    def transaction_totals(self, period, date_from, date_to):
+        return self._rpc("transaction_totals", {"p_period": period, "p_from": date_from, "p_to": date_to}, page_size=PAGE_SIZE)
+
+    def rebuild_daily_rollup(self):
+        return self._rpc("rebuild_transactions_daily", {})
+
+    # --- admin ---
+    def reset(self):
+        # Hati-hati: hanya menghapus isi tabel, tidak menjatuhkan struktur.
+        self.client.table("transactions").delete().neq("id", -1).execute()
+        self.client.table("items").delete().neq("id", -1).execute()
+        self.client.table("users").delete().neq("username", "keep_admin").execute()  # contoh: mengosongkan users
+
+    def is_transient(self, exc):
+        if isinstance(exc, httpx.TransportError):
+            return True
+        if not isinstance(exc, APIError):
+            return False
+        code = str(exc.code or "")
+        if code in TRANSIENT_ERROR_CODES or (code.isdigit() and int(code) in TRANSIENT_HTTP_STATUS):
+            return True
+        return "rate limit" in (exc.message or "").lower()
+
+
+# -------------------------
+# SQLite (lokal)
+# -------------------------
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+  username TEXT PRIMARY KEY,
+  password_hash TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS items (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name TEXT NOT NULL,
+  category TEXT,
+  unit TEXT,
+  quantity REAL DEFAULT 0,
+  min_stock REAL DEFAULT 0,
+  rack_location TEXT,
+  expiry_date TEXT,
+  created_at TEXT,
+  updated_at TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS items_name_unit_key ON items (name, unit);
+
+CREATE TABLE IF NOT EXISTS transactions (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  trx_type TEXT NOT NULL,
+  item_id INTEGER,
+  name TEXT,
+  quantity REAL,
+  unit TEXT,
+  requester TEXT,
+  supplier TEXT,
+  note TEXT,
+  bundle_code TEXT,
+  trx_code TEXT,
+  expiry_date TEXT,
+  created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS transactions_created_at_idx ON transactions (created_at);
+CREATE INDEX IF NOT EXISTS transactions_bundle_code_idx ON transactions (bundle_code);
+
+CREATE TABLE IF NOT EXISTS transactions_daily (
+  day TEXT NOT NULL,
+  name TEXT NOT NULL DEFAULT '',
+  unit TEXT NOT NULL DEFAULT '',
+  trx_type TEXT NOT NULL,
+  quantity REAL NOT NULL DEFAULT 0,
+  trx_count INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, name, unit, trx_type)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS transactions_daily_ins AFTER INSERT ON transactions
+WHEN NEW.created_at IS NOT NULL
+BEGIN
+  INSERT INTO transactions_daily (day, name, unit, trx_type, quantity, trx_count)
+  VALUES (date(NEW.created_at), coalesce(NEW.name, ''), coalesce(NEW.unit, ''), NEW.trx_type, coalesce(NEW.quantity, 0), 1)
+  ON CONFLICT (day, name, unit, trx_type) DO UPDATE SET
+    quantity = quantity + excluded.quantity,
+    trx_count = trx_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS transactions_daily_del AFTER DELETE ON transactions
+WHEN OLD.created_at IS NOT NULL
+BEGIN
+  UPDATE transactions_daily
+  SET quantity = quantity - coalesce(OLD.quantity, 0), trx_count = trx_count - 1
+  WHERE day = date(OLD.created_at) AND name = coalesce(OLD.name, '') AND unit = coalesce(OLD.unit, '') AND trx_type = OLD.trx_type;
+  DELETE FROM transactions_daily
+  WHERE day = date(OLD.created_at) AND name = coalesce(OLD.name, '') AND unit = coalesce(OLD.unit, '') AND trx_type = OLD.trx_type
+    AND trx_count <= 0;
+END;
+"""
+
+_SQL_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+(\w+)", re.I)
+_FILTER_OPS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+_PERIOD_FORMATS = {"W": "%Y-%W", "M": "%Y-%m"}
+
+
+def _ident(name):
+    # nama kolom/tabel berasal dari kode, bukan dari input pengguna
+    if not name.replace("_", "").isalnum():
+        raise ValueError(f"Nama kolom tidak valid: {name}")
+    return name
+
+
+class SQLiteBackend(StorageBackend):
+    """ Backend lokal. Satu koneksi per thread (WAL, synchronous=NORMAL), semua
+    penulisan multi-langkah dalam satu transaksi BEGIN IMMEDIATE. ":memory:"
+    memakai satu koneksi bersama yang dikunci. """
+
+    name = "sqlite"
+
+    def __init__(self, path="gudang.db"):
+        self.path = path
+        self.key = f"sqlite:{path}"
+        self._local = threading.local()
+        self._memory = path == ":memory:"
+        self._lock = threading.RLock() if self._memory else None
+        self._shared = self._connect()
+        self._shared.executescript(SQLITE_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA busy_timeout = 5000")
+        if not self._memory:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    @property
+    def conn(self):
+        if self._memory:
+            return self._shared
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _guard(self):
+        return self._lock if self._lock is not None else nullcontext()
+
+    def _query(self, sql, params=()):
+        t0 = time.perf_counter()
+        with self._guard():
+            rows = [dict(r) for r in self.conn.execute(sql, params).fetchall()]
+        table = _SQL_TABLE.search(sql)
+        record(table.group(1) if table else "?", sql.split(None, 1)[0].lower(), [repr(p) for p in params][:5],
+               rows=len(rows), seconds=time.perf_counter() - t0)
+        return rows
+
+    @contextmanager
+    def _write(self, table, op):
+        """ satu transaksi tulis; dicatat ke trace sebagai satu panggilan `op` """
+        t0 = time.perf_counter()
+        with self._guard():
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException as e:
+                conn.execute("ROLLBACK")
+                record(table, op, seconds=time.perf_counter() - t0, error=f"{type(e).__name__}: {e}")
+                raise
+            conn.execute("COMMIT")
+        record(table, op, seconds=time.perf_counter() - t0)
+
+    # --- users ---
+    def has_users(self):
+        return bool(self._query("SELECT 1 FROM users LIMIT 1"))
+
+    def get_password_hash(self, username):
+        rows = self._query("SELECT password_hash FROM users WHERE username = ?", (username,))
+        return rows[0]["password_hash"] if rows else None
+
+    def add_user(self, username, password_hash):
+        with self._write("users", "insert") as conn:
+            conn.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)", (username, password_hash))
+
+    # --- baca per halaman ---
+    def _where(self, filters):
+        clauses, params = [], []
+        for method, column, value in filters or []:
+            if method == "in_":
+                value = list(value)
+                clauses.append(f"{_ident(column)} IN ({','.join('?' * len(value))})" if value else "0")
+                params.extend(value)
+            else:
+                clauses.append(f"{_ident(column)} {_FILTER_OPS[method]} ?")
+                params.append(value)
+        return clauses, params
+
+    def iter_pages(self, table, columns="*", key="id", after=None, desc=False, filters=None, page_size=None, prefetch=0):
+        """ Lokal tidak perlu prefetch; selalu keyset (key > nilai terakhir). """
+        page_size = page_size or PAGE_SIZE
+        cols = "*" if columns == "*" else ", ".join(_ident(c.strip()) for c in columns.split(","))
+        base_clauses, base_params = self._where(filters)
+        last = after
+        while True:
+            clauses, params = list(base_clauses), list(base_params)
+            if last is not None:
+                clauses.append(f"{_ident(key)} {'<' if desc else '>'} ?")
+                params.append(last)
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+            sql = f"SELECT {cols} FROM {_ident(table)} {where} ORDER BY {_ident(key)} {'DESC' if desc else 'ASC'} LIMIT ?"
+            params.append(page_size)
+            rows = self._query(sql, params)
+            if rows:
+                yield pd.DataFrame(rows)
+            if len(rows) < page_size:
+                return
+            last = rows[-1][key]
+
+    # --- items ---
+    def find_item(self, name, unit):
+        rows = self._query("SELECT * FROM items WHERE name = ? AND unit IS ? ORDER BY id LIMIT 1", (name, unit))
+        return rows[0] if rows else None
+
+    def get_item(self, item_id):
+        rows = self._query("SELECT * FROM items WHERE id = ?", (item_id,))
+        return rows[0] if rows else None
+
+    def find_items(self, names):
+        names = list(names)
+        if not names:
+            return []
+        return self._query(f"SELECT id, name, unit, quantity, updated_at FROM items WHERE name IN ({','.join('?' * len(names))})", names)
+
+    def insert_item(self, fields):
+        cols = [_ident(c) for c in fields]
+        with self._write("items", "insert") as conn:
+            row = conn.execute(
+                f"INSERT INTO items ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) RETURNING *",
+                list(fields.values())).fetchone()
+        return dict(row)
+
+    def update_item_if_quantity(self, item_id, fields, expected_quantity):
+        sets = ", ".join(f"{_ident(c)} = ?" for c in fields)
+        with self._write("items", "update") as conn:
+            row = conn.execute(f"UPDATE items SET {sets} WHERE id = ? AND quantity IS ? RETURNING *",
+                               [*fields.values(), item_id, expected_quantity]).fetchone()
+        return dict(row) if row else None
+
+    def _upsert_item_rows(self, conn, rows, now):
+        out = []
+        for r in rows:
+            row = conn.execute("""
+                INSERT INTO items (name, category, unit, quantity, min_stock, rack_location, expiry_date, created_at, updated_at)
+                VALUES (?, ?, ?, coalesce(?, 0), coalesce(?, 0), ?, ?, ?, ?)
+                ON CONFLICT (name, unit) DO UPDATE SET
+                  quantity = coalesce(items.quantity, 0) + excluded.quantity,
+                  category = excluded.category,
+                  min_stock = excluded.min_stock,
+                  rack_location = excluded.rack_location,
+                  expiry_date = excluded.expiry_date,
+                  updated_at = excluded.updated_at
+                RETURNING *""",
+                (r["name"], r.get("category"), r["unit"], r.get("quantity"), r.get("min_stock"),
+                 r.get("rack_location"), r.get("expiry_date"), r.get("updated_at") or now, r.get("updated_at") or now)).fetchone()
+            out.append(dict(row))
+        return out
+
+    def bulk_upsert_items(self, rows):
+        with self._write("items", "bulk_upsert_items") as conn:
+            return self._upsert_item_rows(conn, rows, None)
+
+    def decrement_stock(self, name, unit, quantity, now):
+        with self._write("items", "decrement_item_stock") as conn:
+            item = conn.execute("SELECT id, quantity FROM items WHERE name = ? AND unit IS ? ORDER BY id LIMIT 1", (name, unit)).fetchone()
+            if item is None:
+                return {"item_id": None, "new_quantity": None, "status": "not_found"}
+            row = conn.execute("""
+                UPDATE items SET quantity = coalesce(quantity, 0) - ?, updated_at = ?
+                WHERE id = ? AND coalesce(quantity, 0) >= ? RETURNING quantity""",
+                (quantity, now, item["id"], quantity)).fetchone()
+            if row is None:
+                return {"item_id": item["id"], "new_quantity": item["quantity"] or 0, "status": "insufficient"}
+            return {"item_id": item["id"], "new_quantity": row["quantity"], "status": "ok"}
+
+    # --- transactions ---
+    _TRX_COLUMNS = ["trx_type", "item_id", "name", "quantity", "unit", "requester", "supplier",
+                    "note", "bundle_code", "trx_code", "expiry_date", "created_at"]
+
+    def _insert_transaction_rows(self, conn, rows):
+        conn.executemany(
+            f"INSERT INTO transactions ({', '.join(self._TRX_COLUMNS)}) VALUES ({', '.join('?' * len(self._TRX_COLUMNS))})",
+            [[r.get(c) for c in self._TRX_COLUMNS] for r in rows])
+
+    def insert_transactions(self, rows):
+        if rows:
+            with self._write("transactions", "insert") as conn:
+                self._insert_transaction_rows(conn, rows)
+
+    def recent_transactions(self, limit):
+        return self._query("SELECT * FROM transactions ORDER BY created_at DESC LIMIT ?", (limit,))
+
+    def commit_out_bundle(self, bundle_code, trx_code, requester, lines, now):
+        need = {}
+        for it in lines:
+            k = (it["name"], it["unit"])
+            need[k] = need.get(k, 0) + (it.get("quantity") or 0)
+        with self._write("transactions", "commit_out_bundle") as conn:
+            found = {}
+            for name, unit in need:
+                row = conn.execute("SELECT * FROM items WHERE name = ? AND unit IS ? ORDER BY id LIMIT 1", (name, unit)).fetchone()
+                found[(name, unit)] = dict(row) if row else None
+            errors = []
+            for i, it in enumerate(lines):
+                k = (it["name"], it["unit"])
+                row = found[k]
+                if (it.get("quantity") or 0) <= 0:
+                    err = "Jumlah harus > 0"
+                elif row is None:
+                    err = "Item tidak ditemukan"
+                elif (row["quantity"] or 0) < need[k]:
+                    err = f"Stok: {row['quantity'] or 0}, diminta: {need[k]}"
+                else:
+                    continue
+                errors.append({"line": i, "name": it["name"], "unit": it["unit"], "error": err})
+            if errors:
+                return {"ok": False, "errors": errors, "items": []}
+            items = []
+            for k, qty in need.items():
+                row = conn.execute("UPDATE items SET quantity = coalesce(quantity, 0) - ?, updated_at = ? WHERE id = ? RETURNING *",
+                                   (qty, now, found[k]["id"])).fetchone()
+                items.append(dict(row))
+            self._insert_transaction_rows(conn, [{
+                "trx_type": "out", "item_id": found[(it["name"], it["unit"])]["id"], "name": it["name"],
+                "quantity": it["quantity"], "unit": it["unit"], "requester": requester, "supplier": None,
+                "note": it.get("note"), "bundle_code": bundle_code, "trx_code": trx_code, "created_at": now
+            } for it in lines])
+        return {"ok": True, "errors": [], "items": items}
+
+    def commit_in_bundle(self, bundle_code, trx_code, supplier, note, lines, now):
+        errors = [{"line": i, "name": it["name"], "unit": it["unit"], "error": "Nama, satuan, dan jumlah (>0) harus diisi"}
+                  for i, it in enumerate(lines)
+                  if not it.get("name") or not it.get("unit") or (it.get("quantity") or 0) <= 0]
+        if errors:
+            return {"ok": False, "errors": errors, "items": []}
+        # satu baris per (name, unit), aturan sama dengan gudang_data._merge_duplicate_keys:
+        # quantity dijumlah, category/rack_location terisi terakhir, min_stock terbesar,
+        # expiry_date paling awal
+        merged = {}
+        for it in lines:
+            k = (it["name"], it["unit"])
+            if k not in merged:
+                merged[k] = {**it, "updated_at": now}
+                continue
+            m = merged[k]
+            m["quantity"] = (m["quantity"] or 0) + it["quantity"]
+            for col in ("category", "rack_location"):
+                if it.get(col):
+                    m[col] = it[col]
+            if it.get("min_stock") is not None:
+                m["min_stock"] = max(m.get("min_stock") or 0, it["min_stock"])
+            if it.get("expiry_date") and (not m.get("expiry_date") or str(it["expiry_date"]) < str(m["expiry_date"])):
+                m["expiry_date"] = it["expiry_date"]
+        with self._write("transactions", "commit_in_bundle") as conn:
+            items = self._upsert_item_rows(conn, list(merged.values()), now)
+            ids = {(r["name"], r["unit"]): r["id"] for r in items}
+            self._insert_transaction_rows(conn, [{
+                "trx_type": "in", "item_id": ids[(it["name"], it["unit"])], "name": it["name"],
+                "quantity": it["quantity"], "unit": it["unit"], "requester": None, "supplier": supplier,
+                "note": note, "bundle_code": bundle_code, "trx_code": trx_code,
+                "expiry_date": it.get("expiry_date"), "created_at": now
+            } for it in lines])
+        return {"ok": True, "errors": [], "items": items}
+
+    def transaction_totals(self, period, date_from, date_to):
+        clauses, params = [], [_PERIOD_FORMATS[period]]
+        if date_from is not None:
+            clauses.append("day >= ?")
+            params.append(date_from)
+        if date_to is not None:
+            clauses.append("day <= ?")
+            params.append(date_to)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._query(f"""
+            SELECT strftime(?, day) AS period, name, unit, trx_type, sum(quantity) AS quantity
+            FROM transactions_daily {where}
+            GROUP BY 1, 2, 3, 4
+            ORDER BY 1, 2, 3, 4""", params)
+
+    def rebuild_daily_rollup(self):
+        with self._write("transactions_daily", "rebuild_transactions_daily") as conn:
+            conn.execute("DELETE FROM transactions_daily")
+            cur = conn.execute("""
+                INSERT INTO transactions_daily (day, name, unit, trx_type, quantity, trx_count)
+                SELECT date(created_at), coalesce(name, ''), coalesce(unit, ''), trx_type, sum(coalesce(quantity, 0)), count(*)
+                FROM transactions
+                WHERE created_at IS NOT NULL
+                GROUP BY 1, 2, 3, 4""")
+            return cur.rowcount
+
+    # --- admin ---
+    def reset(self):
+        with self._write("*", "delete") as conn:
+            conn.execute("DELETE FROM transactions")
+            conn.execute("DELETE FROM items")
+            conn.execute("DELETE FROM users WHERE username != 'keep_admin'")
+
+    def is_transient(self, exc):
+        # busy_timeout habis saat writer lain memegang lock
+        return isinstance(exc, sqlite3.OperationalError) and ("locked" in str(exc) or "busy" in str(exc))
@@ -39,243 +39,76 @@
 # );
 # ----------------------------------------------------------------
 #
+# 2) Jalankan file SQL di folder migrations/ secara berurutan. Tanpa migrasi
+#    aplikasi tetap jalan, tetapi memakai jalur lambat (satu request per baris).
+#
+# 3) Mode lokal tanpa jaringan: set STORAGE_BACKEND = "sqlite" (opsional
+#    SQLITE_PATH, default gudang.db) di st.secrets atau environment. Skema SQLite
+#    dibuat otomatis beserta akun admin default.
+#
 
 
+import os
 import streamlit as st
 import pandas as pd
-import io
-from datetime import datetime, timedelta, date
+from datetime import datetime, timedelta
 import altair as alt
-import random
-import hashlib
-from supabase import create_client, Client
+from gudang_storage import (
+    SupabaseBackend, SQLiteBackend, make_supabase_client,
+    SUPABASE_POOL_SIZE, SUPABASE_TIMEOUT, SUPABASE_CONNECT_TIMEOUT,
+)
+from gudang_trace import start_trace
+from gudang_jobs import submit_import, get_job, get_job_errors, list_jobs, resume_job
+from gudang_data import (
+    use_backend, ensure_default_admin, verify_login, add_user, generate_trx_code,
+    get_inventory_df, get_items_list, get_item_unit, check_stock, upsert_item,
+    adjust_item_for_out, add_transaction_record, commit_out_bundle, commit_in_bundle,
+    prepare_import, diff_inventory_import, export_db_to_excel_file, export_table_file, EXPORT_FORMATS, load_transactions_df, TRANSACTION_KEY_COLUMNS,
+    IMPORT_WORKERS, recent_transactions_df, totals_for_period, transactions_between, fetch_concurrently, rebuild_daily_rollup, reset_database,
+)
 
 # -------------------------
-# Supabase client (from secrets)
+# Storage backend (from secrets / environment)
 # -------------------------
-if "SUPABASE_URL" not in st.secrets or "SUPABASE_KEY" not in st.secrets:
-    st.error("SUPABASE_URL dan SUPABASE_KEY belum ada di st.secrets. Silakan tambahkan sebelum menjalankan.")
-    st.stop()
-
-SUPABASE_URL = st.secrets["SUPABASE_URL"]
-SUPABASE_KEY = st.secrets["SUPABASE_KEY"]
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+def get_config(key, default=None):
+    # environment dulu supaya mode lokal bisa jalan tanpa secrets.toml
+    if key in os.environ:
+        return os.environ[key]
+    try:
+        return st.secrets.get(key, default)
+    except FileNotFoundError:
+        return default
+
+@st.cache_resource
+def _sqlite_backend(path) -> SQLiteBackend:
+    backend = SQLiteBackend(path)
+    use_backend(backend)
+    ensure_default_admin()
+    return backend
+
+@st.cache_resource
+def _supabase_backend(url, key, pool_size, timeout, connect_timeout) -> SupabaseBackend:
+    # satu client (dan pool koneksi keep-alive) per proses, dipakai semua sesi dan rerun
+    return SupabaseBackend(make_supabase_client(url, key, pool_size=pool_size, timeout=timeout,
+                                                connect_timeout=connect_timeout))
+
+STORAGE_BACKEND = get_config("STORAGE_BACKEND", "supabase")
+if STORAGE_BACKEND == "sqlite":
+    use_backend(_sqlite_backend(get_config("SQLITE_PATH", "gudang.db")))
+else:
+    SUPABASE_URL = get_config("SUPABASE_URL")
+    SUPABASE_KEY = get_config("SUPABASE_KEY")
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        st.error("SUPABASE_URL dan SUPABASE_KEY belum ada di st.secrets. Silakan tambahkan sebelum menjalankan.")
+        st.stop()
+    use_backend(_supabase_backend(
+        SUPABASE_URL, SUPABASE_KEY,
+        int(get_config("SUPABASE_POOL_SIZE", SUPABASE_POOL_SIZE)),
+        float(get_config("SUPABASE_TIMEOUT", SUPABASE_TIMEOUT)),
+        float(get_config("SUPABASE_CONNECT_TIMEOUT", SUPABASE_CONNECT_TIMEOUT)),
+    ))
 if "auth" not in st.session_state:
     st.session_state.auth = False
-# -------------------------
-# Utility: hashing password
-# -------------------------
-def hash_pw(pw: str) -> str:
-    return hashlib.sha256(pw.encode("utf-8")).hexdigest()
-
-# -------------------------
-# Ensure default admin exists
-# -------------------------
-def ensure_default_admin():
-    q = supabase.table("users").select("username").limit(1).execute()
-    if not q.data:
-        supabase.table("users").insert({
-            "username": "admin",
-            "password_hash": hash_pw("admin123")
-        }).execute()
-
-# -------------------------
-# Auth
-# -------------------------
-def verify_login(username: str, password: str) -> bool:
-    if not username:
-        return False
-    pw_hash = hash_pw(password)
-    q = supabase.table("users").select("password_hash").eq("username", username).limit(1).execute()
-    if not q.data:
-        return False
-    return q.data[0].get("password_hash") == pw_hash
-
-# -------------------------
-# Helpers: items & transactions
-# -------------------------
-def generate_trx_code(trx_type: str) -> str:
-    now = datetime.now().strftime('%Y%m%d-%H%M%S')
-    return f"TRX-{trx_type.upper()}-{now}-{random.randint(100,999)}"
-
-def get_inventory_df() -> pd.DataFrame:
-    q = supabase.table("items").select("*").order("name", desc=False).execute()
-
-    rows = q.data or []
-    if not rows:
-        return pd.DataFrame(columns=["id","name","category","unit","quantity","min_stock","rack_location","expiry_date","created_at","updated_at"])
-    df = pd.DataFrame(rows)
-    # Normalize dates
-    if "expiry_date" in df.columns:
-        df["expiry_date"] = pd.to_datetime(df["expiry_date"], errors="coerce").dt.date
-    if "created_at" in df.columns:
-        df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce")
-    return df
-
-def get_items_list():
-    df = get_inventory_df()
-    if df.empty:
-        return []
-    return df["name"].tolist()
-
-def get_item_unit(name: str):
-    if not name:
-        return ""
-    q = supabase.table("items").select("unit").eq("name", name).limit(1).execute()
-    if not q.data:
-        return ""
-    return q.data[0].get("unit","") or ""
-
-def upsert_item(name, category, unit, quantity, min_stock=0.0, rack_location="", expiry_date=None):
-    name = (name or "").strip()
-    now = datetime.now().isoformat()
-    # find by name+unit
-    res = supabase.table("items").select("*").eq("name", name).eq("unit", unit).limit(1).execute()
-    if res.data:
-        item = res.data[0]
-        existing_qty = item.get("quantity") or 0
-        new_qty = existing_qty + (quantity or 0)
-        supabase.table("items").update({
-            "quantity": new_qty,
-            "category": category,
-            "min_stock": min_stock,
-            "rack_location": rack_location,
-            "expiry_date": expiry_date.isoformat() if isinstance(expiry_date, (date,)) else expiry_date,
-            "updated_at": now
-        }).eq("id", item["id"]).execute()
-        return item["id"]
-    else:
-        ins = supabase.table("items").insert({
-            "name": name,
-            "category": category,
-            "unit": unit,
-            "quantity": quantity or 0,
-            "min_stock": min_stock or 0,
-            "rack_location": rack_location,
-            "expiry_date": expiry_date.isoformat() if isinstance(expiry_date, (date,)) else expiry_date,
-            "created_at": now,
-            "updated_at": now
-        }).execute()
-        return ins.data[0]["id"]
-
-def adjust_item_for_out(name, unit, quantity):
-    res = supabase.table("items").select("*").eq("name", name).eq("unit", unit).limit(1).execute()
-    if not res.data:
-        return None, "Item tidak ditemukan"
-    item = res.data[0]
-    existing = item.get("quantity") or 0
-    if existing < quantity:
-        return None, f"Stok tidak cukup: tersedia {existing}"
-    new_qty = existing - quantity
-    supabase.table("items").update({"quantity": new_qty, "updated_at": datetime.now().isoformat()}).eq("id", item["id"]).execute()
-    return item["id"], None
-
-def add_transaction_record(trx_type, item_id, name, quantity, unit, requester, supplier, note, bundle_code, trx_code, expiry_date=None):
-    now = datetime.now().isoformat()
-    supabase.table("transactions").insert({
-        "trx_type": trx_type,
-        "item_id": item_id,
-        "name": name,
-        "quantity": quantity,
-        "unit": unit,
-        "requester": requester,
-        "supplier": supplier,
-        "note": note,
-        "bundle_code": bundle_code,
-        "trx_code": trx_code,
-        "expiry_date": expiry_date.isoformat() if isinstance(expiry_date, (date,)) else expiry_date,
-        "created_at": now
-    }).execute()
-
-# -------------------------
-# Load / Export
-# -------------------------
-def load_inventory_from_excel(buffer) -> int:
-    """ buffer can be file-like or BytesIO from uploaded file """
-    if isinstance(buffer, io.BytesIO):
-        buffer.seek(0)
-        df = pd.read_excel(buffer)
-    else:
-        df = pd.read_excel(buffer)
-
-    df_columns = {c.lower(): c for c in df.columns}
-    required = ['name', 'quantity', 'unit']
-    for r in required:
-        if r not in df_columns:
-            raise ValueError(f"Excel harus memiliki kolom: {', '.join(required)}")
-
-    inserted = 0
-    for _, row in df.iterrows():
-        name = str(row[df_columns['name']]).strip()
-        quantity = float(row[df_columns['quantity']]) if not pd.isna(row[df_columns['quantity']]) else 0.0
-        unit = str(row[df_columns['unit']]).strip()
-        category = str(row[df_columns['category']]).strip() if 'category' in df_columns else ''
-        min_stock = float(row[df_columns['min_stock']]) if 'min_stock' in df_columns and not pd.isna(row[df_columns['min_stock']]) else 0.0
-        rack_location = str(row[df_columns['rack_location']]).strip() if 'rack_location' in df_columns else ''
-        expiry_date = None
-        if 'expiry_date' in df_columns and not pd.isna(row[df_columns['expiry_date']]):
-            val = row[df_columns['expiry_date']]
-            if isinstance(val, (pd.Timestamp, datetime, date)):
-                expiry_date = val.date() if isinstance(val, pd.Timestamp) else (val if isinstance(val, date) else None)
-            else:
-                # try parse
-                try:
-                    expiry_date = pd.to_datetime(val).date()
-                except:
-                    expiry_date = None
-
-        upsert_item(name, category, unit, quantity, min_stock, rack_location, expiry_date)
-        inserted += 1
-
-    return inserted
-
-def export_db_to_excel_bytes():
-    items_q = supabase.table("items").select("*").order("name", {"ascending": True}).execute()
-    trans_q = supabase.table("transactions").select("*").order("created_at", {"ascending": False}).execute()
-    df_items = pd.DataFrame(items_q.data or [])
-    df_trans = pd.DataFrame(trans_q.data or [])
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        df_items.to_excel(writer, sheet_name="inventory", index=False)
-        df_trans.to_excel(writer, sheet_name="transactions", index=False)
-        writer.save()
-    return output.getvalue()
-
-# -------------------------
-# Reporting helpers
-# -------------------------
-def load_transactions_df():
-    q = supabase.table("transactions").select("*").order("created_at", desc=False).execute()
-    df = pd.DataFrame(q.data or [])
-    if df.empty:
-        return df
-    df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce")
-    df["date"] = df["created_at"].dt.date
-    df["month"] = df["created_at"].dt.to_period("M").dt.to_timestamp()
-    df["week"] = df["created_at"].dt.to_period("W").dt.start_time
-    return df
-
-def totals_for_period(df, period, date_from=None, date_to=None):
-    if df.empty:
-        return pd.DataFrame()
-
-    # pastikan kolom date sudah datetime
-    df['date'] = pd.to_datetime(df['date'])
-
-    # Mingguan
-    if period == 'W':
-        df['week'] = df['date'].dt.strftime('%Y-%W')
-        g = df.groupby(['week', 'name', 'unit', 'trx_type'])['quantity'].sum().reset_index()
-        return g
-
-    # Bulanan
-    if period == 'M':
-        df['month'] = df['date'].dt.strftime('%Y-%m')
-        g = df.groupby(['month', 'name', 'unit', 'trx_type'])['quantity'].sum().reset_index()
-        return g
-
-    return pd.DataFrame()
-
 
 
 # --- Login ---
@@ -299,6 +132,8 @@ if not st.session_state.auth:
 # Main UI after login
 st.sidebar.title("Menu")
 menu = st.sidebar.radio("Pilih", ["Dashboard", "Upload Inventaris (Excel)", "Barang Masuk", "Barang Keluar", "Laporan & Analisis", "Pengaturan"])
+trace = start_trace(menu, st.sidebar.toggle("Debug: panggilan backend", key="debug_trace"))
+debug_panel = st.sidebar.container()
 st.sidebar.write("User:", st.session_state.user)
 if st.sidebar.button("Logout"):
     st.session_state.auth = False
@@ -308,32 +143,38 @@ if st.sidebar.button("Logout"):
 # --- Dashboard ---
 if menu == "Dashboard":
     st.title("Dashboard Gudang")
-    inv = get_inventory_df()
-    st.subheader("Inventaris")
-    if inv.empty:
-        st.info("Inventaris kosong. Silakan upload data awal.")
-    else:
-        st.dataframe(inv)
-        low = inv[inv["quantity"] <= inv["min_stock"]]
-        if not low.empty:
-            st.warning("Beberapa item mencapai atau di bawah min stock:")
-            st.table(low[["name","quantity","min_stock","unit"]])
-
-    st.subheader("Transaksi Terakhir")
-    trans_q = (supabase.table("transactions").select("*") .order("created_at", desc=True) .limit(20).execute())
-
-    trans_df = pd.DataFrame(trans_q.data or [])
-    st.dataframe(trans_df)
-
-    st.subheader("Total per Item (seluruh waktu)")
-    df_all = load_transactions_df()
-    period = st.selectbox("Pilih Periode", ["W", "M"])
-    totals_all = totals_for_period(df_all,period)
+    inv_box, trans_box, totals_box = st.container(), st.container(), st.container()
+    with totals_box:
+        st.subheader("Total per Item (seluruh waktu)")
+        period = st.selectbox("Pilih Periode", ["W", "M"])
+    # tiga pembacaan independen dijalankan bersamaan, baru dirender setelah semuanya selesai;
+    # totals dari rollup harian, history mentah hanya dimuat jika RPC belum dipasang
+    inv, trans_df, totals_all = fetch_concurrently(
+        get_inventory_df,
+        lambda: recent_transactions_df(20),
+        lambda: totals_for_period(None, period),
+    )
+
+    with inv_box:
+        st.subheader("Inventaris")
+        if inv.empty:
+            st.info("Inventaris kosong. Silakan upload data awal.")
+        else:
+            st.dataframe(inv)
+            low = inv[inv["quantity"] <= inv["min_stock"]]
+            if not low.empty:
+                st.warning("Beberapa item mencapai atau di bawah min stock:")
+                st.table(low[["name","quantity","min_stock","unit"]])
+
+    with trans_box:
+        st.subheader("Transaksi Terakhir")
+        st.dataframe(trans_df)
+
     st.dataframe(totals_all)
 
-    if not df_all.empty:
-        in_all = df_all[df_all["trx_type"]=="in"].groupby("name")["quantity"].sum().reset_index()
-        out_all = df_all[df_all["trx_type"]=="out"].groupby("name")["quantity"].sum().reset_index()
+    if not totals_all.empty:
+        in_all = totals_all[totals_all["trx_type"]=="in"].groupby("name")["quantity"].sum().reset_index()
+        out_all = totals_all[totals_all["trx_type"]=="out"].groupby("name")["quantity"].sum().reset_index()
         st.markdown("Grafik Total Masuk (seluruh waktu)")
         c = alt.Chart(in_all).mark_bar().encode(x="name:N", y="quantity:Q").properties(height=300).interactive()
         st.altair_chart(c, use_container_width=True)
@@ -346,19 +187,84 @@ elif menu == "Upload Inventaris (Excel)":
     st.title("Upload Inventaris Awal dari Excel/CSV")
     st.markdown("Format minimal: kolom `name`, `quantity`, `unit`. Optional: `category`, `min_stock`, `rack_location`, `expiry_date`")
     uploaded = st.file_uploader("Pilih file Excel (.xlsx) atau CSV", type=["xlsx","xls","csv"])
-    if uploaded:
+    plan = st.session_state.get("import_plan")
+    if not uploaded:
+        st.session_state.pop("import_plan", None)
+    elif plan is None or plan["file_id"] != uploaded.file_id:
+        bar = st.progress(0.0, text="Membaca file...")
         try:
-            if uploaded.name.lower().endswith(".csv"):
-                df = pd.read_csv(uploaded)
-                buf = io.BytesIO()
-                df.to_excel(buf, index=False)
-                buf.seek(0)
-                inserted = load_inventory_from_excel(buf)
-            else:
-                inserted = load_inventory_from_excel(uploaded)
-            st.success(f"Sukses memuat {inserted} baris dari file ke inventaris")
+            # CSV dibaca per chunk, XLSX lewat engine cepat; parse sekali, dipakai dry run dan commit
+            progress = lambda rows, fraction: bar.progress(fraction, text=f"Membaca file... {rows:,} baris divalidasi")
+            plan = {"file_id": uploaded.file_id, "prepared": prepare_import(uploaded, name=uploaded.name, progress=progress)}
+            st.session_state["import_plan"] = plan
         except Exception as e:
+            plan = None
             st.error("Gagal memuat file: " + str(e))
+        bar.empty()
+    if uploaded and plan and plan["prepared"] is not None:
+        # dry run: dibandingkan dengan snapshot inventaris, belum ada yang ditulis
+        prepared = plan["prepared"]
+        diff = diff_inventory_import(prepared["merged"])
+        st.subheader("Pratinjau import (belum disimpan)")
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Item baru", int((diff["status"] == "baru").sum()))
+        c2.metric("Item diupdate", int((diff["status"] == "update").sum()))
+        c3.metric("Total tambahan stok", f"{diff['tambah'].sum():,.0f}")
+        c4.metric("Baris tidak valid", prepared["invalid"])
+        if prepared["valid"] > len(diff):
+            st.caption(f"{prepared['valid'] - len(diff)} baris duplikat (name, unit) akan digabung.")
+        st.dataframe(diff)
+        if prepared["invalid"]:
+            with st.expander(f"{prepared['invalid']} baris tidak valid (dilewati)"):
+                st.dataframe(prepared["errors"])
+        if not diff.empty and st.button("Commit import"):
+            # penulisan ke DB berjalan di latar belakang; IMPORT_WORKERS = upsert paralel tanpa RPC bulk
+            workers = int(get_config("IMPORT_WORKERS", IMPORT_WORKERS))
+            st.query_params["import_job"] = submit_import(uploaded, name=uploaded.name, prepared=prepared, workers=workers)
+            # file yang sama tidak ditawarkan lagi (quantity akan terjumlah dua kali)
+            st.session_state["import_plan"] = {"file_id": uploaded.file_id, "prepared": None}
+            st.rerun()
+
+    # job id disimpan di URL supaya progress tetap terlihat setelah browser di-refresh
+    job_id = st.query_params.get("import_job")
+    job = get_job(job_id)
+    if job:
+        active = job["status"] in ("queued", "running")
+
+        @st.fragment(run_every=1 if active else None)
+        def import_progress():
+            job = get_job(job_id)
+            total = job["total"] or 1
+            written = job["committed"] + len(job.get("partial") or ())
+            st.progress(min(written / total, 1.0),
+                        text=f"{job['file_name']}: {written}/{job['total']} item · {job['rows_per_sec']:.0f} item/detik")
+            if job["status"] in ("queued", "running"):
+                return
+            if active:
+                st.rerun()  # selesai/gagal: render ulang halaman (tombol, tabel inventaris)
+            if job["status"] == "done":
+                st.success(f"Sukses memuat {job['rows']} baris dari file ke inventaris "
+                           f"({job['total']} item, {job['rows_per_sec']:.0f} item/detik)")
+                if job.get("writes_saved"):
+                    st.info(f"{job['writes_saved']} baris duplikat (name, unit) digabung sebelum ditulis; "
+                            "quantity dijumlah, min_stock terbesar, expiry_date paling awal, "
+                            "category/rack_location terisi terakhir.")
+                if job.get("invalid"):
+                    st.warning(f"{job['invalid']} baris dilewati karena tidak valid:")
+                    st.dataframe(get_job_errors(job_id))
+            else:
+                st.error(f"Import berhenti di {written}/{job['total']} item: "
+                         + (job["error"] or "proses server terhenti"))
+                if st.button("Lanjutkan dari item terakhir"):
+                    resume_job(job_id)
+                    st.rerun(scope="app")
+        import_progress()
+
+    jobs = list_jobs()
+    if jobs:
+        with st.expander("Riwayat import"):
+            st.dataframe(pd.DataFrame(jobs)[["id", "file_name", "status", "committed", "total", "invalid", "rows_per_sec", "created_at", "error"]]
+                     .rename(columns={"rows_per_sec": "items_per_sec"}))
     st.markdown("---")
     st.subheader("Lihat Inventaris Saat Ini")
     st.dataframe(get_inventory_df())
@@ -484,25 +390,14 @@ elif menu == "Barang Masuk":
             if errors:
                 st.error("\n".join(errors))
             else:
-                trx_code = generate_trx_code("in")
-                bundle = trx_code
-
-                for it in st.session_state.in_multi:
-                    # convert expiry if possible
-                    exp = None
-                    if it.get("expiry_date"):
-                        try:
-                            exp = pd.to_datetime(it.get("expiry_date")).date()
-                        except:
-                            exp = None
-
-                st.success("Transaksi berhasil disimpan!")
-
-                item_id = upsert_item(it["name"], it.get("category",""), it["unit"], it["quantity"], it.get("min_stock",0.0), it.get("rack_location",""), exp)
-                add_transaction_record("in", item_id, it["name"], it["quantity"], it["unit"], requester=None, supplier=supplier, note=note, bundle_code=bundle, trx_code=trx_code, expiry_date=exp)
-                st.success(f"Sukses menyimpan batch masuk. Trx: {trx_code}")
-                st.session_state.in_multi = []
-                st.rerun()
+                # semua baris (bukan hanya yang terakhir) disimpan dalam satu request
+                trx_code, errors, stats = commit_in_bundle(st.session_state.in_multi, supplier, note)
+                if errors:
+                    st.error("\n".join(f"Baris {e['line']+1} ({e['name']}): {e['error']}" for e in errors))
+                else:
+                    st.success(f"Sukses menyimpan batch masuk ({stats['lines']} baris, {stats['lines_per_sec']:.0f} baris/detik). Trx: {trx_code}")
+                    st.session_state.in_multi = []
+                    st.rerun()
 
 # --- Barang Keluar ---
 elif menu == "Barang Keluar":
@@ -530,12 +425,12 @@ elif menu == "Barang Keluar":
                     st.error("Nama, jumlah (>0), satuan dan nama peminta harus diisi")
                 else:
                     # validate stock
-                    res = supabase.table("items").select("quantity").eq("name", name).eq("unit", unit).limit(1).execute()
-                    if not res.data:
+                    problem = check_stock(name, unit, qty)
+                    if problem == "Item tidak ditemukan":
                         st.error("Item tidak ditemukan di inventory")
                     else:
-                        if (res.data[0].get("quantity") or 0) < qty:
-                            st.error(f"Stok tidak cukup. Stok: {res.data[0].get('quantity')}, diminta: {qty}")
+                        if problem:
+                            st.error(f"Stok tidak cukup. {problem}")
                         else:
                             item_id, err = adjust_item_for_out(name, unit, qty)
                             if err:
@@ -586,24 +481,16 @@ elif menu == "Barang Keluar":
                     if bad:
                         st.error("\n".join(bad))
                     else:
-                        # check all stocks first
-                        insufficient = []
-                        for it in st.session_state.out_multi:
-                            res = supabase.table("items").select("quantity").eq("name", it["name"]).eq("unit", it["unit"]).limit(1).execute()
-                            if not res.data:
-                                insufficient.append((it["name"], "Item tidak ditemukan"))
-                            else:
-                                if (res.data[0].get("quantity") or 0) < it["quantity"]:
-                                    insufficient.append((it["name"], f"Stok: {res.data[0].get('quantity')}, diminta: {it['quantity']}"))
+                        # validasi, kurangi stok dan catat semua baris sekaligus
+                        try:
+                            trx_code, insufficient = commit_out_bundle(st.session_state.out_multi, requester)
+                        except Exception as e:
+                            trx_code, insufficient = None, None
+                            st.error("Gagal menyimpan batch keluar: " + str(e))
                         if insufficient:
-                            msgs = [f"{n}: {m}" for n,m in insufficient]
+                            msgs = [f"Baris {e['line']+1} ({e['name']}): {e['error']}" for e in insufficient]
                             st.error("Transaksi ditolak karena stok tidak mencukupi atau item hilang:\n" + "\n".join(msgs))
-                        else:
-                            trx_code = generate_trx_code("out")
-                            bundle = trx_code
-                            for it in st.session_state.out_multi:
-                                item_id, _ = adjust_item_for_out(it["name"], it["unit"], it["quantity"])
-                                add_transaction_record("out", item_id, it["name"], it["quantity"], it["unit"], requester=requester, supplier=None, note=it.get("note",""), bundle_code=bundle, trx_code=trx_code)
+                        elif trx_code:
                             st.success(f"Sukses menyimpan batch keluar. Trx: {trx_code}")
                             st.session_state.out_multi = []
                             st.rerun()
@@ -630,40 +517,37 @@ elif menu == "Laporan & Analisis":
     if df.empty:
         st.info("Belum ada transaksi untuk ditampilkan")
     else:
-        totals = totals_for_period(df, period,date_from=date_from, date_to=date_to)
+        totals = totals_for_period(df, "W" if period == "Mingguan" else "M", date_from=date_from, date_to=date_to)
         st.subheader("Total per Item dalam Periode Terpilih")
         st.dataframe(totals)
-        in_period = df[(df["trx_type"]=="in") & (df["date"]>=date_from) & (df["date"]<=date_to)]
-        out_period = df[(df["trx_type"]=="out") & (df["date"]>=date_from) & (df["date"]<=date_to)]
+        in_range = transactions_between(df, date_from, date_to).drop(columns=TRANSACTION_KEY_COLUMNS)
+        in_period = in_range[in_range["trx_type"]=="in"]
+        out_period = in_range[in_range["trx_type"]=="out"]
         st.subheader("Transaksi Masuk (IN)")
         if in_period.empty:
             st.info("Tidak ada transaksi masuk pada periode yang dipilih")
         else:
             st.dataframe(in_period)
             st.markdown("Grafik: Total Masuk per Item (periode terpilih)")
-            in_sum = in_period.groupby("name")["quantity"].sum().reset_index()
+            in_sum = in_period.groupby("name", observed=True)["quantity"].sum().reset_index()
             st.altair_chart(alt.Chart(in_sum).mark_bar().encode(x="name:N", y="quantity:Q").properties(height=300), use_container_width=True)
         st.subheader("Transaksi Keluar (OUT)")
         if out_period.empty:
             st.info("Tidak ada transaksi keluar pada periode yang dipilih")
         else:
             st.dataframe(out_period)
-            out_sum = out_period.groupby("name")["quantity"].sum().reset_index()
+            out_sum = out_period.groupby("name", observed=True)["quantity"].sum().reset_index()
             st.altair_chart(alt.Chart(out_sum).mark_bar().encode(x="name:N", y="quantity:Q").properties(height=300), use_container_width=True)
 
-        # Monthly/Weekly summary
+        # Monthly/Weekly summary (seluruh history, dari rollup harian)
         if period == "Mingguan":
-            g = df.copy()
-            g["week"] = g["created_at"].dt.strftime("%Y-%W")
-            pivot = g.groupby(["week","name","unit","trx_type"])["quantity"].sum().reset_index()
+            pivot = totals_for_period(df, "W")
             if pivot.empty:
                 st.info("Tidak ada data mingguan")
             else:
                 st.dataframe(pivot)
         else:
-            g = df.copy()
-            g["month"] = g["created_at"].dt.strftime("%Y-%m")
-            pivot = g.groupby(["month","name","unit","trx_type"])["quantity"].sum().reset_index()
+            pivot = totals_for_period(df, "M")
             if pivot.empty:
                 st.info("Tidak ada data bulanan")
             else:
@@ -672,8 +556,26 @@ elif menu == "Laporan & Analisis":
     st.markdown("---")
     st.subheader("Download Data")
     if st.button("Download seluruh DB (Excel)"):
-        bytes_xlsx = export_db_to_excel_bytes()
-        st.download_button("Klik untuk download seluruh DB", bytes_xlsx, file_name="gudang_supabase.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        path = export_db_to_excel_file()
+        try:
+            with open(path, "rb") as f:
+                st.download_button("Klik untuk download seluruh DB", f, file_name="gudang_supabase.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        finally:
+            os.remove(path)
+
+    st.markdown("Snapshot untuk analisis (BI): `items` lengkap, `transactions` sesuai rentang tanggal di atas.")
+    formats = {"Parquet": "parquet", "Arrow IPC": "arrow", "CSV (gzip)": "csv.gz"}
+    fmt = formats[st.selectbox("Format", list(formats))]
+    if st.button("Siapkan file"):
+        ext, mime = EXPORT_FORMATS[fmt]
+        names = {"items": f"items{ext}", "transactions": f"transactions_{date_from:%Y%m%d}_{date_to:%Y%m%d}{ext}"}
+        for table, file_name in names.items():
+            path = export_table_file(table, fmt, date_from=date_from, date_to=date_to)
+            try:
+                with open(path, "rb") as f:
+                    st.download_button(f"Download {file_name}", f, file_name=file_name, mime=mime, key=f"dl_{table}")
+            finally:
+                os.remove(path)
 
 # --- Pengaturan ---
 elif menu == "Pengaturan":
@@ -688,32 +590,46 @@ elif menu == "Pengaturan":
                 st.error("Isi username dan password")
             else:
                 try:
-                    supabase.table("users").insert({"username": new_user, "password_hash": hash_pw(new_pw)}).execute()
+                    add_user(new_user, new_pw)
                     st.success("User ditambahkan")
                 except Exception as e:
                     st.error("Gagal menambah user: " + str(e))
     st.markdown("---")
+    st.subheader("Rollup Laporan")
+    st.caption("Rollup harian (transactions_daily) dijaga otomatis oleh trigger. Bangun ulang jika pernah tidak sinkron.")
+    if st.button("Bangun ulang rollup harian"):
+        n = rebuild_daily_rollup()
+        if n is None:
+            st.error("Fungsi rebuild_transactions_daily belum ada. Jalankan migrations/006_transactions_daily.sql")
+        else:
+            st.success(f"Rollup dibangun ulang: {n} baris")
+    st.markdown("---")
     st.subheader("Hapus / Reset DB (HATI-HATI)")
     if st.checkbox("Tunjukkan opsi reset DB"):
         if st.button("Reset seluruh DB (hapus semua records)"):
             # Hati-hati: hanya menghapus isi tabel, tidak menjatuhkan struktur.
-            supabase.table("transactions").delete().neq("id", -1).execute()
-            supabase.table("items").delete().neq("id", -1).execute()
-            supabase.table("users").delete().neq("username", "keep_admin").execute()  # contoh: mengosongkan users
+            reset_database()
             st.success("DB telah dikosongkan. Silakan refresh.")
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+# --- Debug panel (opt-in): panggilan backend rerun ini & rata-rata per halaman ---
+if trace is not None:
+    totals = trace.totals()
+    pages = st.session_state.setdefault("trace_pages", {})
+    agg = pages.setdefault(menu, {"reruns": 0, "calls": 0, "db_seconds": 0.0, "bytes": 0})
+    agg["reruns"] += 1
+    agg["calls"] += totals["calls"]
+    agg["db_seconds"] += totals["db_seconds"]
+    agg["bytes"] += totals["bytes"]
+    with debug_panel:
+        st.caption(f"{totals['calls']} panggilan, {totals['rows']} baris, {totals['bytes'] / 1024:.0f} KB, "
+                   f"DB {totals['db_seconds']:.2f}s / rerun {totals['rerun_seconds']:.2f}s")
+        with st.expander("Per tabel"):
+            st.dataframe(trace.by_table(), hide_index=True)
+        with st.expander("Panggilan terlambat"):
+            st.dataframe(trace.slowest()[["table", "op", "filters", "rows", "seconds"]], hide_index=True)
+        with st.expander("Per halaman (rata-rata per rerun)"):
+            st.dataframe(pd.DataFrame([
+                {"halaman": p, "rerun": a["reruns"], "panggilan": a["calls"] / a["reruns"],
+                 "DB detik": a["db_seconds"] / a["reruns"], "KB": a["bytes"] / a["reruns"] / 1024}
+                for p, a in pages.items()
+            ]), hide_index=True)
@@ -0,0 +1,159 @@
+# gudang_trace.py
+# Instrumentasi panggilan backend per rerun: tabel, operasi, filter, jumlah baris,
+# ukuran payload dan waktu setiap .execute(). Trace aktif disimpan di contextvar,
+# jadi thread pool harus menjalankan tugas lewat contextvars.copy_context().run.
+
+import contextvars
+import json
+import threading
+import time
+
+import pandas as pd
+
+SLOWEST_CALLS = 10
+_VALUE_REPR = 60  # panjang maksimum nilai filter yang dicatat
+
+_current = contextvars.ContextVar("gudang_trace", default=None)
+
+
+class Trace:
+    """ Semua panggilan backend dalam satu rerun (satu halaman menu) """
+
+    def __init__(self, page):
+        self.page = page
+        self.lock = threading.Lock()
+        self.calls = []
+        self.started = time.perf_counter()
+
+    def add(self, call):
+        with self.lock:
+            self.calls.append(call)
+
+    def frame(self) -> pd.DataFrame:
+        with self.lock:
+            calls = list(self.calls)
+        df = pd.DataFrame(calls, columns=["table", "op", "filters", "rows", "sent", "received", "seconds", "error"])
+        return df.astype({"rows": "float64", "sent": "float64", "received": "float64", "seconds": "float64"})
+
+    def totals(self) -> dict:
+        df = self.frame()
+        return {
+            "page": self.page,
+            "calls": len(df),
+            "rows": int(df["rows"].fillna(0).sum()),
+            "bytes": int(df["sent"].fillna(0).sum() + df["received"].fillna(0).sum()),
+            "db_seconds": float(df["seconds"].sum()),
+            "rerun_seconds": time.perf_counter() - self.started,
+        }
+
+    def by_table(self) -> pd.DataFrame:
+        df = self.frame()
+        if df.empty:
+            return df
+        return (df.groupby(["table", "op"], as_index=False)
+                .agg(calls=("seconds", "size"), rows=("rows", "sum"), seconds=("seconds", "sum"))
+                .sort_values("seconds", ascending=False, ignore_index=True))
+
+    def slowest(self, n=SLOWEST_CALLS) -> pd.DataFrame:
+        return self.frame().nlargest(n, "seconds")
+
+
+def start_trace(page, enabled=True):
+    """ Mulai trace baru untuk rerun ini (None = instrumentasi mati) """
+    trace = Trace(page) if enabled else None
+    _current.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current.get()
+
+
+def record(table, op, filters=(), rows=None, sent=None, received=None, seconds=0.0, error=None):
+    trace = _current.get()
+    if trace is not None:
+        trace.add({"table": table, "op": op, "filters": "; ".join(filters), "rows": rows,
+                   "sent": sent, "received": received, "seconds": seconds, "error": error})
+
+
+def _short(value):
+    if isinstance(value, (list, tuple, set)) and len(value) > 5:
+        return f"[{len(value)} nilai]"
+    text = repr(value)
+    return text if len(text) <= _VALUE_REPR else text[:_VALUE_REPR - 3] + "..."
+
+
+def _json_size(value):
+    if value is None:
+        return 0
+    return len(json.dumps(value, default=str, separators=(",", ":")))
+
+
+# -------------------------
+# Wrapper client Supabase
+# -------------------------
+_OPS = {"select", "insert", "update", "upsert", "delete"}
+_WRITE_OPS = {"insert", "update", "upsert"}
+_MODIFIERS = {"eq", "neq", "gt", "gte", "lt", "lte", "in_", "is_", "like", "ilike",
+              "contains", "filter", "match", "order", "range", "limit"}
+
+
+class TracedClient:
+    """ Membungkus supabase Client; table()/rpc() mengembalikan builder yang
+    mencatat setiap .execute() ke trace aktif. Atribut lain diteruskan apa adanya. """
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name):
+        return _TracedQuery(self._client.table(name), name, None, (), None)
+
+    def rpc(self, fn, params=None, *args, **kwargs):
+        return _TracedQuery(self._client.rpc(fn, params or {}, *args, **kwargs), fn, "rpc", (), params)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class _TracedQuery:
+    __slots__ = ("_query", "_table", "_op", "_filters", "_payload")
+
+    def __init__(self, query, table, op, filters, payload):
+        self._query = query
+        self._table = table
+        self._op = op
+        self._filters = filters
+        self._payload = payload
+
+    def __getattr__(self, name):
+        attr = getattr(self._query, name)
+        if not callable(attr) or (name not in _OPS and name not in _MODIFIERS):
+            return attr
+
+        def call(*args, **kwargs):
+            op, filters, payload = self._op, self._filters, self._payload
+            if name in _OPS:
+                op = name
+                if name in _WRITE_OPS and args:
+                    payload = args[0]
+            else:
+                filters = filters + (f"{name}({', '.join(_short(a) for a in args)})",)
+            return _TracedQuery(attr(*args, **kwargs), self._table, op, filters, payload)
+        return call
+
+    def execute(self):
+        if _current.get() is None:
+            return self._query.execute()
+        t0 = time.perf_counter()
+        try:
+            res = self._query.execute()
+        except Exception as e:
+            record(self._table, self._op or "?", self._filters, sent=_json_size(self._payload),
+                   seconds=time.perf_counter() - t0, error=f"{type(e).__name__}: {e}")
+            raise
+        seconds = time.perf_counter() - t0
+        data = res.data
+        rows = len(data) if isinstance(data, list) else int(data is not None)
+        record(self._table, self._op or "?", self._filters, rows=rows, sent=_json_size(self._payload),
+               received=_json_size(data), seconds=seconds)
+        return res
@@ -0,0 +1,61 @@
+-- 001_items_bulk_upsert.sql
+-- Kunci unik (name, unit) untuk items + RPC bulk_upsert_items dipakai oleh
+-- load_inventory_from_excel untuk menulis satu chunk dalam satu request.
+-- Jalankan sekali di Supabase SQL Editor.
+
+-- 1) Gabungkan duplikat (name, unit) yang mungkin sudah ada: quantity dijumlah
+--    ke id terkecil, transaksi diarahkan ulang, sisanya dihapus.
+CREATE TEMP TABLE _items_dup AS
+SELECT id, min(id) OVER (PARTITION BY name, unit) AS keep_id
+FROM items;
+
+UPDATE items i
+SET quantity = t.qty
+FROM (
+  SELECT d.keep_id, sum(coalesce(x.quantity, 0)) AS qty
+  FROM items x JOIN _items_dup d ON d.id = x.id
+  GROUP BY d.keep_id
+  HAVING count(*) > 1
+) t
+WHERE i.id = t.keep_id;
+
+UPDATE transactions t
+SET item_id = d.keep_id
+FROM _items_dup d
+WHERE t.item_id = d.id AND d.id <> d.keep_id;
+
+DELETE FROM items i
+USING _items_dup d
+WHERE i.id = d.id AND d.id <> d.keep_id;
+
+DROP TABLE _items_dup;
+
+-- 2) Kunci unik; unit kosong/NULL dianggap sama (PostgreSQL 15+)
+CREATE UNIQUE INDEX IF NOT EXISTS items_name_unit_key
+  ON items (name, unit) NULLS NOT DISTINCT;
+
+-- 3) Upsert banyak baris sekaligus. Quantity dijumlahkan ke stok yang ada,
+--    metadata ditimpa (sama seperti upsert_item). Satu (name, unit) hanya
+--    boleh muncul sekali per panggilan.
+CREATE OR REPLACE FUNCTION bulk_upsert_items(rows jsonb)
+RETURNS SETOF items
+LANGUAGE sql
+AS $$
+  INSERT INTO items AS i (name, category, unit, quantity, min_stock, rack_location, expiry_date, created_at, updated_at)
+  SELECT r.name, r.category, r.unit, coalesce(r.quantity, 0), coalesce(r.min_stock, 0),
+         r.rack_location, r.expiry_date, coalesce(r.updated_at, now()), coalesce(r.updated_at, now())
+  FROM jsonb_to_recordset(rows) AS r(
+    name text, category text, unit text, quantity double precision,
+    min_stock double precision, rack_location text, expiry_date date, updated_at timestamp
+  )
+  ON CONFLICT (name, unit) DO UPDATE SET
+    quantity = coalesce(i.quantity, 0) + excluded.quantity,
+    category = excluded.category,
+    min_stock = excluded.min_stock,
+    rack_location = excluded.rack_location,
+    expiry_date = excluded.expiry_date,
+    updated_at = excluded.updated_at
+  RETURNING i.*;
+$$;
+
+NOTIFY pgrst, 'reload schema';
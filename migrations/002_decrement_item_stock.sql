@@ -0,0 +1,46 @@
+-- 002_decrement_item_stock.sql
+-- Pengurangan stok atomik untuk adjust_item_for_out: cek stok + update dalam
+-- satu statement, sehingga dua petugas yang mengeluarkan item yang sama
+-- bersamaan tidak saling menimpa.
+
+CREATE OR REPLACE FUNCTION decrement_item_stock(
+  p_name text,
+  p_unit text,
+  p_quantity double precision,
+  p_updated_at timestamp DEFAULT NULL
+)
+RETURNS TABLE (item_id integer, new_quantity double precision, status text)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_id integer;
+  v_qty double precision;
+BEGIN
+  SELECT i.id INTO v_id
+  FROM items i
+  WHERE i.name = p_name AND i.unit IS NOT DISTINCT FROM p_unit
+  ORDER BY i.id
+  LIMIT 1;
+
+  IF v_id IS NULL THEN
+    RETURN QUERY SELECT NULL::integer, NULL::double precision, 'not_found'::text;
+    RETURN;
+  END IF;
+
+  -- kondisi stok dievaluasi ulang setelah row lock, jadi aman terhadap race
+  UPDATE items i
+  SET quantity = coalesce(i.quantity, 0) - p_quantity,
+      updated_at = coalesce(p_updated_at, now())
+  WHERE i.id = v_id AND coalesce(i.quantity, 0) >= p_quantity
+  RETURNING i.quantity INTO v_qty;
+
+  IF FOUND THEN
+    RETURN QUERY SELECT v_id, v_qty, 'ok'::text;
+  ELSE
+    SELECT coalesce(i.quantity, 0) INTO v_qty FROM items i WHERE i.id = v_id;
+    RETURN QUERY SELECT v_id, v_qty, 'insufficient'::text;
+  END IF;
+END;
+$$;
+
+NOTIFY pgrst, 'reload schema';
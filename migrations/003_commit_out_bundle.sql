@@ -0,0 +1,85 @@
+-- 003_commit_out_bundle.sql
+-- Simpan transaksi keluar multi-item dalam satu request dan satu transaksi:
+-- validasi semua baris, kurangi stok, lalu insert semua baris transactions
+-- dengan bundle_code yang sama. Jika ada satu baris gagal, tidak ada yang
+-- ditulis dan daftar error per baris dikembalikan.
+-- Memerlukan 001 (kunci unik items(name, unit)).
+
+-- Baris bundle dari jsonb: [{"name", "unit", "quantity", "note", "expiry_date"}, ...]
+-- line = posisi baris (mulai 0) di array input.
+CREATE OR REPLACE FUNCTION bundle_lines(p_lines jsonb)
+RETURNS TABLE (line integer, name text, unit text, quantity double precision, note text, expiry_date date)
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT (e.ord - 1)::integer, x.name, x.unit, x.quantity, x.note, x.expiry_date
+  FROM jsonb_array_elements(p_lines) WITH ORDINALITY AS e(val, ord),
+       jsonb_to_record(e.val) AS x(name text, unit text, quantity double precision, note text, expiry_date date)
+$$;
+
+CREATE OR REPLACE FUNCTION commit_out_bundle(
+  p_bundle_code text,
+  p_trx_code text,
+  p_requester text,
+  p_lines jsonb,
+  p_created_at timestamp DEFAULT NULL
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_now timestamp := coalesce(p_created_at, now());
+  v_errors jsonb;
+  v_items jsonb;
+BEGIN
+  -- kunci semua item yang terlibat (urut id supaya tidak deadlock)
+  PERFORM 1
+  FROM items i
+  JOIN (SELECT DISTINCT l.name, l.unit FROM bundle_lines(p_lines) l) k
+    ON i.name = k.name AND i.unit IS NOT DISTINCT FROM k.unit
+  ORDER BY i.id
+  FOR UPDATE OF i;
+
+  -- stok dicek terhadap total permintaan per item (satu item bisa muncul di beberapa baris)
+  SELECT coalesce(jsonb_agg(jsonb_build_object(
+           'line', l.line,
+           'name', l.name,
+           'unit', l.unit,
+           'error', CASE
+             WHEN coalesce(l.quantity, 0) <= 0 THEN 'Jumlah harus > 0'
+             WHEN i.id IS NULL THEN 'Item tidak ditemukan'
+             ELSE format('Stok: %s, diminta: %s', coalesce(i.quantity, 0), n.qty)
+           END) ORDER BY l.line), '[]'::jsonb)
+  INTO v_errors
+  FROM bundle_lines(p_lines) l
+  JOIN (SELECT b.name, b.unit, sum(b.quantity) AS qty FROM bundle_lines(p_lines) b GROUP BY b.name, b.unit) n
+    ON n.name = l.name AND n.unit IS NOT DISTINCT FROM l.unit
+  LEFT JOIN items i ON i.name = l.name AND i.unit IS NOT DISTINCT FROM l.unit
+  WHERE coalesce(l.quantity, 0) <= 0 OR i.id IS NULL OR coalesce(i.quantity, 0) < n.qty;
+
+  IF jsonb_array_length(v_errors) > 0 THEN
+    RETURN jsonb_build_object('ok', false, 'errors', v_errors, 'items', '[]'::jsonb);
+  END IF;
+
+  WITH n AS (
+    SELECT b.name, b.unit, sum(b.quantity) AS qty FROM bundle_lines(p_lines) b GROUP BY b.name, b.unit
+  ), upd AS (
+    UPDATE items i
+    SET quantity = coalesce(i.quantity, 0) - n.qty, updated_at = v_now
+    FROM n
+    WHERE i.name = n.name AND i.unit IS NOT DISTINCT FROM n.unit
+    RETURNING i.*
+  )
+  SELECT coalesce(jsonb_agg(to_jsonb(upd)), '[]'::jsonb) INTO v_items FROM upd;
+
+  INSERT INTO transactions (trx_type, item_id, name, quantity, unit, requester, supplier, note, bundle_code, trx_code, created_at)
+  SELECT 'out', i.id, l.name, l.quantity, l.unit, p_requester, NULL, l.note, p_bundle_code, p_trx_code, v_now
+  FROM bundle_lines(p_lines) l
+  JOIN items i ON i.name = l.name AND i.unit IS NOT DISTINCT FROM l.unit
+  ORDER BY l.line;
+
+  RETURN jsonb_build_object('ok', true, 'errors', '[]'::jsonb, 'items', v_items);
+END;
+$$;
+
+NOTIFY pgrst, 'reload schema';
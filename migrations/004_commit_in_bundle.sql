@@ -0,0 +1,90 @@
+-- 004_commit_in_bundle.sql
+-- Simpan transaksi masuk multi-item (penerimaan dari pemasok) dalam satu
+-- request dan satu transaksi: upsert semua item lalu insert semua baris
+-- transactions dengan bundle_code yang sama.
+-- Memerlukan 001 (kunci unik items(name, unit)).
+
+-- Baris penerimaan dari jsonb; line = posisi baris (mulai 0) di array input.
+CREATE OR REPLACE FUNCTION in_bundle_lines(p_lines jsonb)
+RETURNS TABLE (
+  line integer, name text, unit text, quantity double precision, category text,
+  min_stock double precision, rack_location text, expiry_date date
+)
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT (e.ord - 1)::integer, x.name, x.unit, x.quantity, x.category, x.min_stock, x.rack_location, x.expiry_date
+  FROM jsonb_array_elements(p_lines) WITH ORDINALITY AS e(val, ord),
+       jsonb_to_record(e.val) AS x(
+         name text, unit text, quantity double precision, category text,
+         min_stock double precision, rack_location text, expiry_date date
+       )
+$$;
+
+CREATE OR REPLACE FUNCTION commit_in_bundle(
+  p_bundle_code text,
+  p_trx_code text,
+  p_supplier text,
+  p_note text,
+  p_lines jsonb,
+  p_created_at timestamp DEFAULT NULL
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_now timestamp := coalesce(p_created_at, now());
+  v_errors jsonb;
+  v_items jsonb;
+BEGIN
+  SELECT coalesce(jsonb_agg(jsonb_build_object(
+           'line', l.line, 'name', l.name, 'unit', l.unit,
+           'error', 'Nama, satuan, dan jumlah (>0) harus diisi') ORDER BY l.line), '[]'::jsonb)
+  INTO v_errors
+  FROM in_bundle_lines(p_lines) l
+  WHERE coalesce(l.name, '') = '' OR coalesce(l.unit, '') = '' OR coalesce(l.quantity, 0) <= 0;
+
+  IF jsonb_array_length(v_errors) > 0 THEN
+    RETURN jsonb_build_object('ok', false, 'errors', v_errors, 'items', '[]'::jsonb);
+  END IF;
+
+  -- satu baris per (name, unit), aturan sama dengan import (_merge_duplicate_keys):
+  -- quantity dijumlah, category/rack_location terisi terakhir, min_stock terbesar,
+  -- expiry_date paling awal
+  WITH agg AS (
+    SELECT l.name, l.unit,
+           sum(l.quantity) AS qty,
+           coalesce((array_agg(l.category ORDER BY l.line DESC)
+                     FILTER (WHERE coalesce(l.category, '') <> ''))[1], '') AS category,
+           max(l.min_stock) AS min_stock,
+           coalesce((array_agg(l.rack_location ORDER BY l.line DESC)
+                     FILTER (WHERE coalesce(l.rack_location, '') <> ''))[1], '') AS rack_location,
+           min(l.expiry_date) AS expiry_date
+    FROM in_bundle_lines(p_lines) l
+    GROUP BY l.name, l.unit
+  ), up AS (
+    INSERT INTO items AS i (name, category, unit, quantity, min_stock, rack_location, expiry_date, created_at, updated_at)
+    SELECT a.name, a.category, a.unit, a.qty, coalesce(a.min_stock, 0), a.rack_location, a.expiry_date, v_now, v_now
+    FROM agg a
+    ON CONFLICT (name, unit) DO UPDATE SET
+      quantity = coalesce(i.quantity, 0) + excluded.quantity,
+      category = excluded.category,
+      min_stock = excluded.min_stock,
+      rack_location = excluded.rack_location,
+      expiry_date = excluded.expiry_date,
+      updated_at = excluded.updated_at
+    RETURNING i.*
+  )
+  SELECT coalesce(jsonb_agg(to_jsonb(up)), '[]'::jsonb) INTO v_items FROM up;
+
+  INSERT INTO transactions (trx_type, item_id, name, quantity, unit, requester, supplier, note, bundle_code, trx_code, expiry_date, created_at)
+  SELECT 'in', i.id, l.name, l.quantity, l.unit, NULL, p_supplier, p_note, p_bundle_code, p_trx_code, l.expiry_date, v_now
+  FROM in_bundle_lines(p_lines) l
+  JOIN items i ON i.name = l.name AND i.unit IS NOT DISTINCT FROM l.unit
+  ORDER BY l.line;
+
+  RETURN jsonb_build_object('ok', true, 'errors', '[]'::jsonb, 'items', v_items);
+END;
+$$;
+
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,35 @@
+-- 005_transaction_totals.sql
+-- Agregasi laporan per minggu/bulan di server: totals_for_period hanya
+-- menerima baris hasil agregasi, bukan seluruh isi tabel transactions.
+
+CREATE INDEX IF NOT EXISTS transactions_created_at_idx ON transactions (created_at);
+
+-- Label periode sama dengan strftime Python: 'W' -> '%Y-%W' (minggu mulai Senin,
+-- hari sebelum Senin pertama = minggu 00), 'M' -> '%Y-%m'.
+CREATE OR REPLACE FUNCTION period_label(p_period text, p_ts timestamp)
+RETURNS text
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT CASE
+    WHEN p_period = 'W' THEN to_char(p_ts, 'YYYY') || '-' ||
+      lpad(((extract(doy FROM p_ts)::int + 7 - extract(isodow FROM p_ts)::int) / 7)::text, 2, '0')
+    ELSE to_char(p_ts, 'YYYY-MM')
+  END
+$$;
+
+-- p_from / p_to inklusif (tanggal); NULL = tanpa batas.
+CREATE OR REPLACE FUNCTION transaction_totals(p_period text, p_from date DEFAULT NULL, p_to date DEFAULT NULL)
+RETURNS TABLE (period text, name text, unit text, trx_type text, quantity double precision)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT period_label(p_period, t.created_at), t.name, t.unit, t.trx_type, sum(t.quantity)
+  FROM transactions t
+  WHERE (p_from IS NULL OR t.created_at >= p_from)
+    AND (p_to IS NULL OR t.created_at < p_to + 1)
+  GROUP BY 1, 2, 3, 4
+  ORDER BY 1, 2, 3, 4
+$$;
+
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,122 @@
+-- 006_transactions_daily.sql
+-- Rollup harian transaksi (hari, item, satuan, trx_type) yang dijaga trigger
+-- pada setiap insert/update/delete di transactions. Laporan mingguan/bulanan
+-- (transaction_totals) membaca rollup ini, bukan baris mentah.
+-- Memerlukan 005 (period_label).
+
+CREATE TABLE IF NOT EXISTS transactions_daily (
+  day DATE NOT NULL,
+  name TEXT NOT NULL DEFAULT '',
+  unit TEXT NOT NULL DEFAULT '',
+  trx_type TEXT NOT NULL,
+  quantity DOUBLE PRECISION NOT NULL DEFAULT 0,
+  trx_count INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, name, unit, trx_type)
+);
+
+CREATE OR REPLACE FUNCTION transactions_daily_apply()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    UPDATE transactions_daily d
+    SET quantity = d.quantity - o.qty, trx_count = d.trx_count - o.cnt
+    FROM (
+      SELECT r.created_at::date AS day, coalesce(r.name, '') AS name, coalesce(r.unit, '') AS unit,
+             r.trx_type, sum(coalesce(r.quantity, 0)) AS qty, count(*) AS cnt
+      FROM old_rows r
+      GROUP BY 1, 2, 3, 4
+    ) o
+    WHERE d.day = o.day AND d.name = o.name AND d.unit = o.unit AND d.trx_type = o.trx_type;
+
+    DELETE FROM transactions_daily WHERE trx_count <= 0;
+  END IF;
+
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    INSERT INTO transactions_daily AS d (day, name, unit, trx_type, quantity, trx_count)
+    SELECT r.created_at::date, coalesce(r.name, ''), coalesce(r.unit, ''), r.trx_type,
+           sum(coalesce(r.quantity, 0)), count(*)
+    FROM new_rows r
+    WHERE r.created_at IS NOT NULL
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (day, name, unit, trx_type) DO UPDATE SET
+      quantity = d.quantity + excluded.quantity,
+      trx_count = d.trx_count + excluded.trx_count;
+  END IF;
+
+  RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION transactions_daily_truncate()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  DELETE FROM transactions_daily;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS transactions_daily_ins ON transactions;
+CREATE TRIGGER transactions_daily_ins
+  AFTER INSERT ON transactions
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION transactions_daily_apply();
+
+DROP TRIGGER IF EXISTS transactions_daily_upd ON transactions;
+CREATE TRIGGER transactions_daily_upd
+  AFTER UPDATE ON transactions
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION transactions_daily_apply();
+
+DROP TRIGGER IF EXISTS transactions_daily_del ON transactions;
+CREATE TRIGGER transactions_daily_del
+  AFTER DELETE ON transactions
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION transactions_daily_apply();
+
+DROP TRIGGER IF EXISTS transactions_daily_trunc ON transactions;
+CREATE TRIGGER transactions_daily_trunc
+  AFTER TRUNCATE ON transactions
+  FOR EACH STATEMENT EXECUTE FUNCTION transactions_daily_truncate();
+
+-- Backfill / rebuild penuh dari history. Insert baru ditahan selama rebuild.
+CREATE OR REPLACE FUNCTION rebuild_transactions_daily()
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_rows integer;
+BEGIN
+  LOCK TABLE transactions IN SHARE MODE;
+  DELETE FROM transactions_daily;
+  INSERT INTO transactions_daily (day, name, unit, trx_type, quantity, trx_count)
+  SELECT t.created_at::date, coalesce(t.name, ''), coalesce(t.unit, ''), t.trx_type,
+         sum(coalesce(t.quantity, 0)), count(*)
+  FROM transactions t
+  WHERE t.created_at IS NOT NULL
+  GROUP BY 1, 2, 3, 4;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RETURN v_rows;
+END;
+$$;
+
+-- Laporan sekarang membaca rollup (ukurannya tidak tumbuh per transaksi).
+CREATE OR REPLACE FUNCTION transaction_totals(p_period text, p_from date DEFAULT NULL, p_to date DEFAULT NULL)
+RETURNS TABLE (period text, name text, unit text, trx_type text, quantity double precision)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT period_label(p_period, d.day::timestamp), d.name, d.unit, d.trx_type, sum(d.quantity)
+  FROM transactions_daily d
+  WHERE (p_from IS NULL OR d.day >= p_from)
+    AND (p_to IS NULL OR d.day <= p_to)
+  GROUP BY 1, 2, 3, 4
+  ORDER BY 1, 2, 3, 4
+$$;
+
+SELECT rebuild_transactions_daily();
+
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,167 @@
+import io
+
+import pandas as pd
+import pytest
+
+import gudang_data as gd
+from gudang_storage import SQLiteBackend
+
+
+@pytest.fixture
+def backend():
+    b = SQLiteBackend(":memory:")
+    gd.use_backend(b)
+    yield b
+    gd.invalidate_inventory_cache()
+    gd.invalidate_transactions_cache()
+
+
+def _trx(trx_type, name, requester=None, supplier=None, created_at="2026-10-01T10:00:00"):
+    return {"trx_type": trx_type, "item_id": 1, "name": name, "quantity": 1, "unit": "pcs",
+            "requester": requester, "supplier": supplier, "note": "", "bundle_code": "B",
+            "trx_code": "T", "expiry_date": None, "created_at": created_at}
+
+
+def test_incremental_transactions_with_all_null_text_column(backend):
+    backend.insert_transactions([_trx("in", "Kertas", supplier="PT A")])
+    assert len(gd.load_transactions_df()) == 1
+    # batch kedua: supplier semuanya None (barang keluar biasa)
+    backend.insert_transactions([_trx("out", "Kertas", requester="Gudang", created_at="2026-10-02T10:00:00")])
+    df = gd.load_transactions_df()
+    assert len(df) == 2
+    assert isinstance(df["supplier"].dtype, pd.CategoricalDtype)
+    assert df["supplier"].isna().tolist() == [False, True]
+    assert "None" not in df["supplier"].cat.categories
+    assert df["requester"].tolist()[1] == "Gudang"
+
+
+def test_upload_dates_are_day_first_regardless_of_earlier_values(backend):
+    first = pd.DataFrame({"name": ["a", "b"], "quantity": ["1", "1"], "unit": ["pcs", "pcs"],
+                          "expiry_date": ["02/13/2027", "25/03/2027"]})
+    clean, errors = gd._parse_inventory_frame(first)
+    assert clean["expiry_date"].tolist() == [pd.Timestamp("2027-03-25").date()]
+    assert errors["row"].tolist() == [2]
+    # nilai ambigu dari upload sebelumnya tidak mengubah urutan untuk upload berikutnya
+    second = pd.DataFrame({"name": ["c"], "quantity": ["1"], "unit": ["pcs"], "expiry_date": ["01/02/2027"]})
+    clean, _ = gd._parse_inventory_frame(second)
+    assert clean["expiry_date"].tolist() == [pd.Timestamp("2027-02-01").date()]
+
+
+def test_bundle_in_uses_same_date_order_as_upload(backend):
+    line = {"name": "Tinta", "unit": "pcs", "quantity": 2, "expiry_date": "01/02/2027"}
+    trx_code, errors, _ = gd.commit_in_bundle([line], "PT A", "")
+    assert trx_code and not errors
+    assert gd.lookup_item("Tinta", "pcs") is not None
+    inv = gd.get_inventory_df()
+    assert inv.loc[inv["name"] == "Tinta", "expiry_date"].tolist() == [pd.Timestamp("2027-02-01").date()]
+
+
+BUNDLE_DUPLICATES = [
+    {"name": "Lem", "unit": "pcs", "quantity": 2, "category": "ATK", "min_stock": 5,
+     "rack_location": "A1", "expiry_date": "01/06/2027"},
+    {"name": "Lem", "unit": "pcs", "quantity": 3, "category": "", "min_stock": 2,
+     "rack_location": "B2", "expiry_date": "01/03/2027"},
+]
+
+
+def _bundle_item(name):
+    inv = gd.get_inventory_df()
+    row = inv.loc[inv["name"] == name].iloc[0]
+    return row[["quantity", "category", "min_stock", "rack_location", "expiry_date"]].tolist()
+
+
+@pytest.mark.parametrize("fallback", [False, True])
+def test_bundle_in_merges_duplicates_like_import(backend, monkeypatch, fallback):
+    if fallback:
+        monkeypatch.setattr(backend, "commit_in_bundle", lambda *a: None)
+    trx_code, errors, stats = gd.commit_in_bundle(BUNDLE_DUPLICATES, "PT A", "")
+    assert trx_code and not errors
+    assert stats["mode"] == ("row" if fallback else "rpc")
+    expected = gd._merge_duplicate_keys(gd._parse_inventory_frame(pd.DataFrame(BUNDLE_DUPLICATES))[0])
+    assert _bundle_item("Lem") == [5.0, "ATK", 5.0, "B2", pd.Timestamp("2027-03-01").date()]
+    assert expected[["quantity", "category", "min_stock", "rack_location", "expiry_date"]].iloc[0].tolist() \
+        == _bundle_item("Lem")
+    assert len(gd.load_transactions_df()) == 2
+
+
+def test_out_bundle_fallback_reports_stock_it_could_not_restore(backend, monkeypatch):
+    for name in ("Pena", "Map"):
+        gd.upsert_item(name, "ATK", "pcs", 10)
+    monkeypatch.setattr(backend, "commit_out_bundle", lambda *a: None)
+    adjust = gd.adjust_item_for_out
+
+    def second_fails(name, unit, quantity):
+        if name == "Map":
+            # stok Pena sudah dikurangi; pengembaliannya juga gagal
+            monkeypatch.setattr(backend, "update_item_if_quantity", lambda *a: None)
+            return None, "Stok tidak cukup"
+        return adjust(name, unit, quantity)
+
+    monkeypatch.setattr(gd, "adjust_item_for_out", second_fails)
+    lines = [{"name": "Pena", "unit": "pcs", "quantity": 4}, {"name": "Map", "unit": "pcs", "quantity": 1}]
+    with pytest.raises(RuntimeError, match=r"Pena \(pcs\) \+4"):
+        gd.commit_out_bundle(lines, "Gudang")
+
+
+def test_snapshot_patch_does_not_modify_frame_already_handed_out(backend):
+    gd.upsert_item("Amplop", "ATK", "pcs", 3)
+    shared = gd._inventory_snapshot_df()
+    gd.upsert_item("Amplop", "ATK", "pcs", 2)
+    assert shared["quantity"].tolist() == [3.0]
+    assert gd._inventory_snapshot_df()["quantity"].tolist() == [5.0]
+    assert gd.lookup_item("Amplop", "pcs")["quantity"] == 5.0
+
+
+def test_upload_with_all_blank_optional_columns(backend):
+    data = b"name,quantity,unit,category,min_stock,expiry_date\nA,1,pcs,,,\nB,2,box,,,\n"
+    prepared = gd.prepare_import(io.BytesIO(data), name="template.csv")
+    assert prepared["valid"] == 2 and prepared["invalid"] == 0
+    merged = prepared["merged"]
+    assert merged["category"].tolist() == ["", ""]
+    assert merged["min_stock"].tolist() == [0.0, 0.0]
+    assert merged["expiry_date"].tolist() == [None, None]
+
+
+def test_upload_with_all_blank_name_column_rejects_rows():
+    clean, errors = gd._parse_inventory_frame(pd.DataFrame({"name": [None, ""], "quantity": ["1", "2"], "unit": ["pcs", "pcs"]}))
+    assert clean.empty
+    assert errors["column"].tolist() == ["name", "name"]
+
+
+def test_upload_keeps_internal_whitespace_of_existing_keys(backend):
+    gd.upsert_item("Kertas  A4", "ATK", "rim", 5)
+    prepared = gd.prepare_import(io.BytesIO(b"name,quantity,unit\n Kertas  A4 ,2,rim\n"), name="stok.csv")
+    diff = gd.diff_inventory_import(prepared["merged"])
+    assert diff["name"].tolist() == ["Kertas  A4"]
+    assert diff["status"].tolist() == ["update"]
+
+
+@pytest.mark.parametrize("fallback", [False, True])
+def test_bundle_in_strips_name_and_unit(backend, monkeypatch, fallback):
+    gd.upsert_item("Lem", "ATK", "pcs", 1)
+    if fallback:
+        monkeypatch.setattr(backend, "commit_in_bundle", lambda *a: None)
+    trx_code, errors, _ = gd.commit_in_bundle([{"name": "Lem ", "unit": " pcs", "quantity": 2}], "PT A", "")
+    assert trx_code and not errors
+    inv = gd.get_inventory_df()
+    assert inv[["name", "unit", "quantity"]].values.tolist() == [["Lem", "pcs", 3.0]]
+    assert gd.load_transactions_df()["name"].astype(str).tolist() == ["Lem"]
+
+
+def test_partial_patch_for_unknown_item_refetches_instead_of_appending(backend):
+    gd.upsert_item("Pena", "ATK", "pcs", 10)
+    gd.get_inventory_df()
+    # item dibuat proses lain: belum ada di snapshot proses ini
+    backend.insert_item({"name": "Map", "category": "ATK", "unit": "pcs", "quantity": 10.0,
+                         "min_stock": 20.0, "rack_location": "R1"})
+    item_id, err = gd.adjust_item_for_out("Map", "pcs", 1)
+    assert item_id and not err
+    row = gd.get_inventory_df().set_index("name").loc["Map"]
+    assert (row["quantity"], row["category"], row["min_stock"], row["rack_location"]) == (9.0, "ATK", 20.0, "R1")
+
+
+def test_load_inventory_rate_counts_file_rows(backend):
+    data = b"name,quantity,unit\nA,1,pcs\nA,1,pcs\nB,1,pcs\n"
+    stats = gd.load_inventory(io.BytesIO(data), name="stok.csv")
+    assert (stats["rows"], stats["writes"], stats["writes_saved"]) == (3, 2, 1)
+    assert stats["rows_per_sec"] == pytest.approx(3 / stats["seconds"])
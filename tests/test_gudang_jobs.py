@@ -0,0 +1,51 @@
+import time
+
+import pandas as pd
+import pytest
+
+import gudang_data as gd
+import gudang_jobs as gj
+from gudang_storage import SQLiteBackend
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(gj, "JOBS_DIR", str(tmp_path / "jobs"))
+    b = SQLiteBackend(str(tmp_path / "gudang.db"))
+    gd.use_backend(b)
+    yield b
+    gd.invalidate_inventory_cache()
+
+
+def _wait(job_id):
+    deadline = time.monotonic() + 30
+    while gj.get_job(job_id)["status"] in ("queued", "running"):
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    return gj.get_job(job_id)
+
+
+def test_resume_after_commit_before_progress_does_not_double_apply(backend, monkeypatch):
+    df = pd.DataFrame({"name": [f"item{i}" for i in range(10)], "unit": "pcs", "quantity": "2"})
+    bulk = backend.bulk_upsert_items
+    calls = []
+
+    def commit_then_die(rows):
+        # chunk kedua ter-commit di DB, lalu proses "mati" sebelum state.json diperbarui
+        data = bulk(rows)
+        calls.append(len(rows))
+        if len(calls) == 2:
+            raise RuntimeError("proses berhenti")
+        return data
+
+    monkeypatch.setattr(backend, "bulk_upsert_items", commit_then_die)
+    job_id = gj.submit_import(df, name="stok.csv", chunk_size=4)
+    state = _wait(job_id)
+    assert state["status"] == "failed" and state["committed"] == 4
+
+    assert gj.resume_job(job_id)
+    state = _wait(job_id)
+    assert state["status"] == "done" and state["committed"] == 10
+    # chunk kedua tidak dikirim ulang; hanya chunk ketiga
+    assert calls == [4, 4, 2]
+    assert gd.get_inventory_df()["quantity"].tolist() == [2.0] * 10